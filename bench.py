@@ -0,0 +1,201 @@
+"""
+Benchmarks for the compile and match paths.
+
+Every pattern family is generated at several sizes, each stage of the
+pipeline is timed (and, unless --no-memory is given, run again under
+tracemalloc for its peak memory), and the results are written as JSON
+so that runs on different commits can be compared:
+
+    python bench.py --output before.json
+    python bench.py --families subset_explosion --sizes 4 8 12
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, TypeVar
+
+from python_regex_engine.automata import Dfa, Nfa
+from python_regex_engine.compiled import CompiledDfa
+from python_regex_engine.derivatives import regex_to_dfa
+from python_regex_engine.optimize import simplify
+from python_regex_engine.parser import RegexParser, regex_lexer, regex_to_nfa
+
+ALPHABET = "ab0"
+R = TypeVar("R")
+
+
+def subset_explosion(n: int) -> str:
+    """(a|b)*a(a|b){n}: the minimal DFA has 2^(n+1) states, plus the dead one"""
+    return "(a|b)*a" + "(a|b)" * n
+
+
+def nested_stars(n: int) -> str:
+    """(((a*b)*0)*a)*..., n starred groups deep, cycling through the alphabet"""
+    pattern = "a"
+    for i in range(n):
+        pattern = "({}*{})".format(pattern, ALPHABET[(i + 1) % len(ALPHABET)])
+    return pattern + "*"
+
+
+def long_concatenation(n: int) -> str:
+    return "".join(ALPHABET[i % len(ALPHABET)] for i in range(n))
+
+
+def wide_alternation(n: int) -> str:
+    """n distinct words of three letters, or-ed together"""
+    words = []
+    for i in range(n):
+        word = ""
+        for _ in range(3):
+            i, digit = divmod(i, len(ALPHABET))
+            word += ALPHABET[digit]
+        words.append(word)
+    return "(" + "|".join(words) + ")"
+
+
+FAMILIES: dict[str, tuple[Callable[[int], str], list[int]]] = {
+    "subset_explosion": (subset_explosion, [2, 4, 6, 8]),
+    "nested_stars": (nested_stars, [2, 4, 8, 12]),
+    "long_concatenation": (long_concatenation, [8, 32, 64, 128]),
+    "wide_alternation": (wide_alternation, [3, 9, 27]),
+}
+
+
+def timed(fn: Callable[[], R], memory: bool) -> tuple[R, dict[str, float]]:
+    """Run fn, then (optionally) run it again to find its peak memory"""
+    start = time.perf_counter()
+    result = fn()
+    stats = {"seconds": time.perf_counter() - start}
+    if memory:
+        tracemalloc.start()
+        fn()
+        stats["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, stats
+
+
+def throughput(accepts: Callable[[str], bool], inputs: list[str]) -> float:
+    """Characters matched per second"""
+    start = time.perf_counter()
+    for text in inputs:
+        accepts(text)
+    elapsed = time.perf_counter() - start
+    return sum(map(len, inputs)) / elapsed if elapsed else float("inf")
+
+
+def run_case(
+    pattern: str, args: argparse.Namespace, rng: random.Random
+) -> dict[str, Any]:
+    stages: dict[str, dict[str, float]] = {}
+    memory = not args.no_memory
+
+    if len(pattern) <= args.earley_limit:
+        tree, stages["lark_parse"] = timed(lambda: regex_lexer.parse(pattern), memory)
+        _, stages["lark_transform"] = timed(
+            lambda: RegexParser(ALPHABET).transform(tree), memory
+        )
+    nfa: Nfa[Any]
+    nfa, stages["parse"] = timed(lambda: regex_to_nfa(pattern, ALPHABET), memory)
+    dfa: Dfa[Any]
+    dfa, stages["to_dfa"] = timed(nfa.to_dfa, memory)
+    simple: Nfa[Any]
+    simple, stages["simplify"] = timed(lambda: simplify(nfa), memory)
+    _, stages["simplified_to_dfa"] = timed(simple.to_dfa, memory)
+    # The AST is hash-consed and caches derivatives, so the memory pass
+    # only sees what the first one didn't keep alive
+    derived: Dfa[int]
+    derived, stages["derivatives"] = timed(
+        lambda: regex_to_dfa(pattern, ALPHABET), memory
+    )
+    minimal, stages["minimize"] = timed(dfa.minimize, memory)
+    if len(dfa.state_set) <= args.table_limit:
+        _, stages["minimize_table"] = timed(lambda: dfa.minimize("table"), memory)
+    minimal = minimal.reindex()
+    equal, stages["eq"] = timed(lambda: dfa == minimal, memory)
+    assert equal
+    matcher, stages["compile"] = timed(lambda: CompiledDfa.from_dfa(minimal), memory)
+
+    inputs = [
+        "".join(rng.choice(ALPHABET) for _ in range(args.input_length))
+        for _ in range(args.inputs)
+    ]
+    return {
+        "pattern_length": len(pattern),
+        "states": {
+            "nfa": len(nfa.state_set),
+            "simplified_nfa": len(simple.state_set),
+            "dfa": len(dfa.state_set),
+            "derivative_dfa": len(derived.state_set),
+            "minimal_dfa": len(minimal.state_set),
+        },
+        "stages": stages,
+        "chars_per_second": {
+            "nfa": throughput(nfa.accepts, inputs[: args.nfa_inputs]),
+            "dfa": throughput(minimal.accepts, inputs),
+            "compiled": throughput(matcher.accepts, inputs),
+        },
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--families", nargs="+", choices=FAMILIES, default=FAMILIES)
+    parser.add_argument("--sizes", nargs="+", type=int, help="override every family")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc")
+    parser.add_argument("--inputs", type=int, default=200)
+    parser.add_argument("--input-length", type=int, default=64)
+    parser.add_argument(
+        "--nfa-inputs", type=int, default=5, help="NFA matching is much slower"
+    )
+    parser.add_argument(
+        "--earley-limit", type=int, default=64, help="longest pattern for Lark"
+    )
+    parser.add_argument(
+        "--table-limit", type=int, default=64, help="largest DFA for table minimize"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+    for family in args.families:
+        make_pattern, sizes = FAMILIES[family]
+        for n in args.sizes or sizes:
+            pattern = make_pattern(n)
+            print("{} n={}".format(family, n), file=sys.stderr)
+            case = {"family": family, "n": n, "pattern": pattern}
+            case.update(run_case(pattern, args, rng))
+            results.append(case)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,38 @@
 import sys
 
-from lark import Tree
-
-from python_regex_engine.automata import Nfa
-from python_regex_engine.parser import RegexParser, regex_lexer
+from python_regex_engine import stats
+from python_regex_engine.optimize import simplify
+from python_regex_engine.parser import regex_to_nfa
 
 
 def main() -> None:
+    args = [arg for arg in sys.argv[1:] if arg != "--stats"]
+    if len(args) < len(sys.argv) - 1:
+        with stats.collect() as collected:
+            run(args)
+        print()
+        print("Stats")
+        print("=====")
+        print(collected)
+    else:
+        run(args)
+
+
+def run(args: list[str]) -> None:
     text = "(0|a)b(aba)*"
     test_str = "0baba"
     try:
-        text = sys.argv[1]
+        text = args[0]
     except IndexError:
         print("No regex given, defaulting to '{}'".format(text))
         print()
     try:
-        test_str = sys.argv[2]
+        test_str = args[1]
     except IndexError:
         print("No test string given, defaulting to '{}'".format(test_str))
         print()
 
-    tree = regex_lexer.parse(text)
-    result_mayb_tree = RegexParser().transform(tree)
-    while isinstance(result_mayb_tree, Tree):
-        result_mayb_tree = result_mayb_tree.children[0]
-    result: Nfa[str] = result_mayb_tree
+    result = regex_to_nfa(text)
     print("ε-NFA")
     print("=====")
     print(result)
@@ -35,7 +43,12 @@ def main() -> None:
         else "The test string doesn't match (NFA)"
     )
     print()
-    dfa_large = result.to_dfa()
+    print("NFA")
+    print("===")
+    nfa = simplify(result, report=print)
+    print(nfa)
+    print()
+    dfa_large = nfa.to_dfa()
     dfa = dfa_large.minimize().reindex()
     assert dfa_large == dfa
     print("DFA")
@@ -56,6 +69,8 @@ def main() -> None:
     for string in none + one + two + three + four:
         if dfa.accepts(string) != result.accepts(string):
             print(string)
+        if nfa.accepts(string) != result.accepts(string):
+            print(string)
         if dfa.accepts(string) == (-dfa).accepts(string):
             print(string)
 
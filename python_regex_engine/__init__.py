@@ -0,0 +1,24 @@
+from python_regex_engine.automata import Budget, StateLimitExceeded
+from python_regex_engine.regex import (
+    Pattern,
+    RegexSet,
+    cache_clear,
+    cache_info,
+    compile,
+    counterexample,
+    equivalent,
+)
+from python_regex_engine.search import Match
+
+__all__ = [
+    "Budget",
+    "Match",
+    "Pattern",
+    "RegexSet",
+    "StateLimitExceeded",
+    "cache_clear",
+    "cache_info",
+    "compile",
+    "counterexample",
+    "equivalent",
+]
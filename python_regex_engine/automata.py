@@ -1,15 +1,69 @@
-from collections import defaultdict
-from typing import Self, TypeAlias, TypeVar
+import sys
+from collections import defaultdict, deque
+from typing import (
+    TYPE_CHECKING,
+    Hashable,
+    Iterable,
+    Mapping,
+    NamedTuple,
+    Self,
+    TypeAlias,
+    TypeVar,
+)
 
 from pymonad.monoid import Monoid  # type: ignore[import-untyped]
 
+from python_regex_engine import stats
+from python_regex_engine.charclass import normalize
 from python_regex_engine.monoids import Set
 
+if TYPE_CHECKING:
+    from python_regex_engine.bitset import BitsetNfa
+
 # ALPHABET = string.printable
 ALPHABET = "ab0"
 
 T = TypeVar("T")
 State: TypeAlias = Monoid[T]  # type: ignore[no-any-unimported]
+# A state of one NFA and a set of states of another
+type _Pair[T] = tuple[State[T], frozenset[State[T]]]
+
+
+# The memory one DFA transition takes in a trans_fn dict: its
+# (state, char) key, its target and the dict's slot for it
+TRANSITION_BYTES = sys.getsizeof((0, "")) + sys.getsizeof(1 << 30) + 64
+
+
+class Budget(NamedTuple):
+    """
+    Limits for determinization. max_bytes is checked against an
+    estimate of the memory used while determinizing: the size of each
+    DFA state built (sys.getsizeof of its set of NFA states, or of its
+    derivative) plus TRANSITION_BYTES for each of its |Σ| transitions.
+    The peak is about twice that, as making a Dfa of the result (and,
+    for derivatives, their caches) takes about as much again.
+    """
+
+    max_states: int | None = None
+    max_bytes: int | None = None
+
+    def check(self, states: int, size: int) -> None:
+        if (self.max_states is not None and states > self.max_states) or (
+            self.max_bytes is not None and size > self.max_bytes
+        ):
+            raise StateLimitExceeded(self, states, size)
+
+
+class StateLimitExceeded(RuntimeError):
+    def __init__(self, budget: Budget, states: int, size: int):
+        super().__init__(
+            "Determinization stopped after {} states ({} bytes), over {}".format(
+                states, size, budget
+            )
+        )
+        self.budget = budget
+        self.states = states
+        self.size = size
 
 
 class Nfa[T]:
@@ -31,15 +85,15 @@ class Nfa[T]:
         self.final_set = final_set
 
         # defaultdict is used, so calculating values will fill in
-        # missing items. We need ε's and ε-closures
+        # missing items. We need ε's
         _ = [self.trans_fn[(state, "")] for state in self.state_set]
-        _ = [self.eps_close(val) for val in list(self.trans_fn.values())]
         visible_states: Set[T] = Set().union(*list(self.trans_fn.values()))
         if (
             start.identity_element() in visible_states
             and start.identity_element() not in state_set
         ):
             self.state_set = self.state_set.union(Set({start.identity_element()}))
+            _ = self.trans_fn[(start.identity_element(), "")]
         assert self.state_set.issuperset(visible_states)
 
     def delta(self, state: State[T], char: str) -> Set[State[T]]:
@@ -50,13 +104,14 @@ class Nfa[T]:
         return self.eps_close(Set().union(*possibilities))
 
     def delta_sets(self, cur_states: Set[State[T]], char: str) -> Set[State[T]]:
-        init: set[int] = Set()
-        for state in cur_states:
-            init.union(self.delta(state, char))
         possibilities = [self.delta(state, char) for state in cur_states]
         return self.eps_close(Set().union(*possibilities))
 
+    @stats.stage("nfa_match")
     def delta_star(self, state: State[T], input: str) -> Set[State[T]]:
+        if stats.active is not None:
+            stats.active.count("transitions", len(input))
+        input = normalize(self.alphabet, input)
         cur_state_set = self.eps_close(Set([state]))
         for char in input:
             cur_state_set = self.delta_sets(cur_state_set, char)
@@ -66,51 +121,83 @@ class Nfa[T]:
         return self.delta_star(self.start, input).intersection(self.final_set) != Set()
 
     def eps_close(self, states: Set[State[T]]) -> Set[State[T]]:
-        stack = states.copy()
-        result: Set[State[T]] = states.copy()
-        visited: Set[State[T]] = Set()
-        while len(stack) != 0:
+        stack = list(states)
+        result: set[State[T]] = set(states)
+        visited: set[State[T]] = set()
+        while stack:
             state = stack.pop()
-            if state in self.state_set:  # Should only be triggered if state == ∅
-                result.add(state)
-            else:
+            if state not in self.state_set:  # Should only be triggered if state == ∅
                 continue
+            result.add(state)
             if state not in visited:
-                stack = stack.union(self.trans_fn[(state, "")])
+                stack.extend(self.trans_fn[(state, "")])
             visited.add(state)
-        return result
-
-    def to_dfa(self) -> "Dfa[Set[T]]":
-        new_states: Set[Set[T]] = Set()
-        new_start = self.eps_close(Set(self.start))
-        state_stack: Set[Set[T]] = Set({Set(), new_start})
-        while len(state_stack) != 0:
-            cur_state = state_stack.pop()
-            new_states.add(cur_state)
-            for char in self.alphabet:
-                child_state = self.eps_close(self.delta_sets(cur_state, char))
-                if child_state not in new_states:
-                    state_stack.add(child_state)
-        nested_transition_keys = [
-            [(state, char) for char in self.alphabet] for state in new_states
-        ]
-        transition_keys = [
-            state_and_char
-            for sublist in nested_transition_keys
-            for state_and_char in sublist
+        if stats.active is not None:
+            stats.active.count("eps_close")
+            stats.active.count("eps_close_visited", len(visited))
+        return Set(result)
+
+    @stats.stage("to_dfa")
+    def determinize(
+        self, budget: Budget | None = None
+    ) -> tuple["Dfa[int]", "BitsetNfa[T]", list[int]]:
+        """
+        The subset construction, as a worklist over a BitsetNfa so that
+        each set of NFA states is an int. A set is given the next
+        integer the first time it is reached, the start being 0, so
+        the DFA's states are 0..n-1 in breadth first order; δ of each
+        set and character is computed once.
+
+        Also returns the BitsetNfa and, for each DFA state, its mask of
+        NFA states (see BitsetNfa.to_states). With a budget,
+        StateLimitExceeded is raised as soon as more states or memory
+        would be used.
+        """
+        # bitset builds on this module
+        from python_regex_engine.bitset import BitsetNfa
+
+        bits = BitsetNfa.from_nfa(self)
+        successors = [bits.successors[char] for char in self.alphabet]
+        # Only the states with a transition on a character add to its
+        # target, which in a Thompson NFA is a fraction of them
+        sources = [
+            sum(1 << i for i, targets in enumerate(char_successors) if targets)
+            for char_successors in successors
         ]
-        new_trans_fn: dict[tuple[Set[T], str], Set[Set[T]]] = {
-            (state, char): self.delta_sets(state, char)
-            for state, char in transition_keys
-        }
-        new_finals: Set[Set[T]] = Set(
-            {
-                state
-                for state in new_states
-                if state.intersection(self.final_set) != Set()
-            }
+        names = {bits.start: 0}
+        subsets = [bits.start]
+        trans_fn: dict[tuple[int, str], int] = {}
+        size = sys.getsizeof(bits.start) + len(self.alphabet) * TRANSITION_BYTES
+        for state, subset in enumerate(subsets):
+            for char, char_successors, char_sources in zip(
+                self.alphabet, successors, sources
+            ):
+                target = 0
+                rest = subset & char_sources
+                while rest:
+                    low = rest & -rest
+                    rest ^= low
+                    target |= char_successors[low.bit_length() - 1]
+                name = names.get(target)
+                if name is None:
+                    if budget is not None:
+                        size += sys.getsizeof(target)
+                        size += len(self.alphabet) * TRANSITION_BYTES
+                        budget.check(len(subsets) + 1, size)
+                    name = names[target] = len(subsets)
+                    subsets.append(target)
+                trans_fn[(state, char)] = name
+        if stats.active is not None:
+            stats.active.count("subset_states", len(subsets))
+        finals = [i for i, subset in enumerate(subsets) if subset & bits.final_mask]
+        dfa: Dfa[int] = Dfa(
+            0, Set(list(range(len(subsets)))), self.alphabet, trans_fn, Set(finals)
         )
-        return Dfa(new_start, new_states, self.alphabet, new_trans_fn, new_finals)
+        return dfa, bits, subsets
+
+    def to_dfa(self, budget: Budget | None = None) -> "Dfa[int]":
+        """The DFA of Nfa.determinize"""
+        return self.determinize(budget)[0]
 
     def regex_reduce(self) -> str:
         new_start = "start"
@@ -132,17 +219,89 @@ class Nfa[T]:
         print(clean_nfa)
         return ""
 
+    @stats.stage("inclusion")
+    def subset_counterexample(self, other: "Nfa[T]") -> str | None:
+        """
+        Find a string accepted by self but not by other, or None if
+        L(self) ⊆ L(other), without determinizing either NFA.
+
+        This is the antichain algorithm: it searches breadth first
+        through pairs (p, S) of a state of self and the ε-closed set of
+        states other can be in after the same string, until p is final
+        and S isn't. (p, S) is pruned if (p, S') with S' ⊆ S was seen
+        before, as any string that takes (p, S) to a counterexample
+        takes (p, S') to one too. So only the ⊆-minimal S are kept for
+        each p, which is usually far fewer than the DFA of other has
+        states. Running optimize.simplify on both NFAs first makes the
+        pairs fewer still.
+        """
+        if self.alphabet != other.alphabet:
+            raise ValueError("NFAs over different alphabets can't be compared")
+        mine = _Successors(self)
+        theirs = _Successors(other)
+        finals = frozenset(self.final_set)
+        other_finals = frozenset(other.final_set)
+        antichain: dict[State[T], list[frozenset[State[T]]]] = defaultdict(list)
+        parent: dict[_Pair[T], tuple[_Pair[T], str] | None] = {}
+        queue: deque[_Pair[T]] = deque()
+
+        def add(pair: _Pair[T], step: tuple[_Pair[T], str] | None) -> None:
+            state, macrostate = pair
+            kept = antichain[state]
+            if any(seen <= macrostate for seen in kept):
+                return
+            kept[:] = [seen for seen in kept if not macrostate <= seen]
+            kept.append(macrostate)
+            parent[pair] = step
+            queue.append(pair)
+
+        other_start = theirs.close([other.start])
+        for state in mine.close([self.start]):
+            add((state, other_start), None)
+        while queue:
+            pair = queue.popleft()
+            state, macrostate = pair
+            if macrostate not in antichain[state]:
+                continue  # Dominated since it was queued
+            if stats.active is not None:
+                stats.active.count("pairs_visited")
+            if state in finals and not macrostate & other_finals:
+                witness = []
+                step = parent[pair]
+                while step is not None:
+                    pair, char = step
+                    witness.append(char)
+                    step = parent[pair]
+                return "".join(reversed(witness))
+            for char in self.alphabet:
+                targets = mine.step(frozenset([state]), char)
+                if targets:
+                    other_targets = theirs.step(macrostate, char)
+                    for target in targets:
+                        add((target, other_targets), (pair, char))
+        return None
+
+    def issubset(self, other: "Nfa[T]") -> bool:
+        """Is every string that self accepts accepted by other?"""
+        return self.subset_counterexample(other) is None
+
+    def counterexample(self, other: "Nfa[T]") -> str | None:
+        """A string accepted by exactly one of the NFAs, if any"""
+        witness = self.subset_counterexample(other)
+        if witness is None:
+            witness = other.subset_counterexample(self)
+        return witness
+
     def __eq__(self, other: object) -> bool:
         """
-        Equivalence is checked by converting to DFAs
-        and checking using the symmetric difference
+        Equivalence is checked by language inclusion both ways (see
+        Nfa.subset_counterexample)
         """
         if not isinstance(other, Nfa):
             return False
         if self.alphabet != other.alphabet:
             return False
-        return self.to_dfa() == other.to_dfa()
-        pass
+        return self.counterexample(other) is None
 
     def __str__(self) -> str:
         """
@@ -189,6 +348,64 @@ class Nfa[T]:
         return "\n".join(result_lst)
 
 
+class _Successors[T]:
+    def __init__(self, nfa: Nfa[T]):
+        """
+        The ε-closed successors of sets of states of nfa, computed on
+        demand and memoized. The state nfa uses for "no transition" is
+        left out, so a set with no successors is empty.
+
+        States with only ε-edges are dropped from the closures too:
+        whatever they lead to is in the closure already, so they make
+        no difference, but they would make the sets larger and less
+        often comparable.
+        """
+        self.nfa = nfa
+        self.nothing = nfa.start.identity_element()
+        self.finals = frozenset(nfa.final_set)
+        self.closures: dict[State[T], frozenset[State[T]]] = {}
+        self.steps: dict[tuple[frozenset[State[T]], str], frozenset[State[T]]] = {}
+
+    def _targets(self, state: State[T], char: str) -> list[State[T]]:
+        # .get, as looking up a missing key would add it to the defaultdict
+        targets = self.nfa.trans_fn.get((state, char))
+        if targets is None:
+            return []
+        return [target for target in targets if target != self.nothing]
+
+    def closure(self, state: State[T]) -> frozenset[State[T]]:
+        try:
+            return self.closures[state]
+        except KeyError:
+            pass
+        seen = {state}
+        stack = [state]
+        while stack:
+            for target in self._targets(stack.pop(), ""):
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        result = self.closures[state] = frozenset(
+            target
+            for target in seen
+            if target in self.finals
+            or any(self._targets(target, char) for char in self.nfa.alphabet)
+        )
+        return result
+
+    def close(self, states: Iterable[State[T]]) -> frozenset[State[T]]:
+        return frozenset().union(*[self.closure(state) for state in states])
+
+    def step(self, states: frozenset[State[T]], char: str) -> frozenset[State[T]]:
+        try:
+            return self.steps[(states, char)]
+        except KeyError:
+            pass
+        targets = [t for state in states for t in self._targets(state, char)]
+        result = self.steps[(states, char)] = self.close(targets)
+        return result
+
+
 class Dfa[T]:
     def __init__(
         self,
@@ -229,7 +446,11 @@ class Dfa[T]:
         """
         return self.trans_fn[state, char]
 
+    @stats.stage("dfa_match")
     def delta_star(self, state: State[T], input: str) -> State[T]:
+        if stats.active is not None:
+            stats.active.count("transitions", len(input))
+        input = normalize(self.alphabet, input)
         cur_state = state
         for char in input:
             cur_state = self.delta(cur_state, char)
@@ -239,31 +460,141 @@ class Dfa[T]:
         return self.delta_star(self.start, input) in self.final_set
 
     def _remove_unreachable(self) -> None:
-        visited: Set[State[T]] = Set()
-        state_stack = Set({self.start})
-        while len(state_stack) > 0:
+        visited: set[State[T]] = set()
+        state_stack = [self.start]
+        while state_stack:
             cur_state = state_stack.pop()
             if cur_state in visited:
                 continue
             visited.add(cur_state)
             for char in self.alphabet:
-                state_stack.add(self.delta(cur_state, char))
+                state_stack.append(self.delta(cur_state, char))
         unreachables = self.state_set - visited
-        self.state_set = visited
+        self.state_set = Set(visited)
         for state in unreachables:
             for char in self.alphabet:
                 self.trans_fn.pop((state, char))
         self.final_set = self.final_set.intersection(self.state_set)
 
-    def minimize(self) -> "Dfa[T]":
+    @stats.stage("minimize")
+    def minimize(
+        self,
+        method: str = "hopcroft",
+        labels: Mapping[State[T], Hashable] | None = None,
+    ) -> "Dfa[T]":
+        """
+        Merge indistinguishable states. Two algorithms are available:
+            * "hopcroft": partition refinement, O(|Σ|·|Q| log |Q|)
+            * "table": the pairwise distinguishability table
+        Both name each merged state after its first member in
+        iteration order of the state set, so they return the same DFA
+        and can be cross-checked against each other.
+
+        If `labels` is given, states with different labels are never
+        merged (a missing state has the label None). Since merged
+        states keep the name of one of their members, `labels` still
+        applies to the minimized DFA.
+        """
+        if labels is None:
+            labels = {}
+        if method == "hopcroft":
+            rename = self._hopcroft_renaming(labels)
+        elif method == "table":
+            rename = self._table_renaming(labels)
+        else:
+            raise ValueError("Unknown minimization method: {}".format(method))
+
+        new_start = rename[self.start]
+        new_trans_fn = {
+            (rename[i], c): rename[self.delta(i, c)] for i, c in self.trans_fn
+        }
+        new_states = Set([rename[i] for i in self.state_set])
+        new_finals = Set([rename[i] for i in self.final_set])
+
+        return Dfa(new_start, new_states, self.alphabet, new_trans_fn, new_finals)
+
+    def _initial_class(
+        self, state: State[T], labels: Mapping[State[T], Hashable]
+    ) -> tuple[bool, Hashable]:
+        return (state in self.final_set, labels.get(state))
+
+    def _hopcroft_renaming(
+        self, labels: Mapping[State[T], Hashable]
+    ) -> dict[State[T], State[T]]:
+        """
+        Hopcroft's algorithm: start from the partition {F, Q - F}
+        (refined by labels) and split blocks by the predecessors of a
+        splitter block until the partition is stable. The inverse
+        transition index means each split only touches the states that
+        actually lead into the splitter.
+        """
+        state_list = list(self.state_set)
+        index = {state: i for i, state in enumerate(state_list)}
+        inverse: dict[tuple[int, str], list[int]] = defaultdict(list)
+        for (state, char), target in self.trans_fn.items():
+            inverse[(index[target], char)].append(index[state])
+
+        initial: dict[tuple[bool, Hashable], set[int]] = defaultdict(set)
+        for i, state in enumerate(state_list):
+            initial[self._initial_class(state, labels)].add(i)
+        blocks: list[set[int]] = list(initial.values())
+        block_of = [0] * len(state_list)
+        for block_id, block in enumerate(blocks):
+            for i in block:
+                block_of[i] = block_id
+
+        # Every initial block but the largest has to be a splitter
+        largest = max(range(len(blocks)), key=lambda b: len(blocks[b]))
+        work: set[tuple[int, str]] = {
+            (block_id, char)
+            for block_id in range(len(blocks))
+            if block_id != largest
+            for char in self.alphabet
+        }
+        rounds = 0
+        while work:
+            rounds += 1
+            splitter_id, char = work.pop()
+            predecessors: dict[int, set[int]] = defaultdict(set)
+            for target in blocks[splitter_id]:
+                for source in inverse[(target, char)]:
+                    predecessors[block_of[source]].add(source)
+            for block_id, inside in predecessors.items():
+                if len(inside) == len(blocks[block_id]):
+                    continue
+                # Split off the states leading into the splitter
+                new_id = len(blocks)
+                blocks[block_id] -= inside
+                blocks.append(inside)
+                for i in inside:
+                    block_of[i] = new_id
+                for split_char in self.alphabet:
+                    if (block_id, split_char) in work:
+                        work.add((new_id, split_char))
+                    elif len(inside) <= len(blocks[block_id]):
+                        work.add((new_id, split_char))
+                    else:
+                        work.add((block_id, split_char))
+        if stats.active is not None:
+            stats.active.count("minimize_rounds", rounds)
+
+        # Name each block after its first member, like _table_renaming
+        representative: dict[int, State[T]] = {}
+        for i, state in enumerate(state_list):
+            representative.setdefault(block_of[i], state)
+        return {
+            state: representative[block_of[i]] for i, state in enumerate(state_list)
+        }
+
+    def _table_renaming(
+        self, labels: Mapping[State[T], Hashable]
+    ) -> dict[State[T], State[T]]:
         distinguishable_matrix: dict[tuple[State[T], State[T]], bool] = dict()
         state_list = list(self.state_set)
         for state_i in state_list:
             for state_j in state_list[0 : state_list.index(state_i)]:
-                i_in_final = state_i in self.final_set
-                j_in_final = state_j in self.final_set
-                init_dist = (i_in_final and not j_in_final) or (
-                    j_in_final and not i_in_final
+                init_dist = self._initial_class(state_i, labels) != self._initial_class(
+                    state_j, labels
                 )
                 distinguishable_matrix[(state_i, state_j)] = init_dist
 
@@ -276,7 +607,9 @@ class Dfa[T]:
                 return distinguishable_matrix[(state_j, state_i)]
 
         changed = True
+        rounds = 0
         while changed:
+            rounds += 1
             changed = False
             for state_i, state_j in distinguishable_matrix:
                 if distinguishable(state_i, state_j) or state_i == state_j:
@@ -291,6 +624,8 @@ class Dfa[T]:
                         except KeyError:
                             distinguishable_matrix[(state_j, state_i)] = True
                         changed = True
+        if stats.active is not None:
+            stats.active.count("minimize_rounds", rounds)
         rename = {i: i for i in self.state_set}
         rename.update(
             {
@@ -309,18 +644,15 @@ class Dfa[T]:
                 prev_val = cur_val
                 cur_val = rename[cur_val]
             rename[key] = cur_val
+        return rename
 
-        new_start = rename[self.start]
-        new_trans_fn = {
-            (rename[i], c): rename[self.delta(i, c)] for i, c in self.trans_fn
-        }
-        new_states = Set([rename[i] for i in self.state_set])
-        new_finals = Set([rename[i] for i in self.final_set])
-
-        return Dfa(new_start, new_states, self.alphabet, new_trans_fn, new_finals)
-
-    def reindex(self) -> "Dfa[int]":
-        new_names = {state: i for i, state in enumerate(self.state_set)}
+    def reindex(self, new_names: dict[State[T], int] | None = None) -> "Dfa[int]":
+        """
+        Rename the states to 0..n-1, in iteration order of the state
+        set unless the caller gives the renaming.
+        """
+        if new_names is None:
+            new_names = {state: i for i, state in enumerate(self.state_set)}
         new_start = new_names[self.start]
         new_states: State[int] = Set([new_names[state] for state in self.state_set])
         new_trans_fn = {
@@ -334,49 +666,55 @@ class Dfa[T]:
         We can verify equality using the symmetric difference:
             A△ B = (A - B) ∪ (B - A)
         The symmetric difference of the languages of the two DFAs
-        is empty iff the two DFAs are equivalent. This can be
-        checked by doing a depth/breadth first search on the product
-        construction; if no final states are found then the DFAs are
-        equivalent.
+        is empty iff the two DFAs are equivalent. This is checked by
+        a breadth first search on the product construction (see
+        Dfa.counterexample).
         """
         if not isinstance(other, Dfa):
             return False
         if self.alphabet != other.alphabet:
             return False
-        # Instead of doing a depth/breadth first search, just
-        # construct the product and minimize.
-        new_start = (self.start, other.start)
-        new_finals: Set[tuple[State[T], State[T]]] = Set(
-            [
-                (f1, s2)  # type: ignore[arg-type]
-                for f1 in self.final_set
-                for s2 in other.state_set - other.final_set
-            ]
-        ) + Set(
-            [  # type: ignore[arg-type]
-                (s1, f2)
-                for s1 in self.state_set - self.final_set
-                for f2 in other.final_set
-            ]
-        )
-        new_state_set: Set[tuple[State[T], State[T]]] = Set(
-            [(s1, s2) for s1 in self.state_set for s2 in other.state_set]
-        )
-        new_trans: dict[
-            tuple[tuple[State[T], State[T]], str], tuple[State[T], State[T]]
-        ] = {
-            ((s1, s2), char): (self.delta(s1, char), other.delta(s2, char))
-            for s1 in self.state_set
-            for s2 in other.state_set
-            for char in self.alphabet
-        }
-        sym_diff: Dfa[tuple[State[T], State[T]]] = Dfa(
-            new_start, new_state_set, self.alphabet, new_trans, new_finals
-        ).minimize()
-        # If the symmetric difference has one state and it is
-        # non-accepting, then the language of the symmetric difference
-        # is empty and the DFAs are the same
-        return len(sym_diff.state_set) == 1 and len(sym_diff.final_set) == 0
+        return self.counterexample(other) is None
+
+    @stats.stage("equivalence")
+    def counterexample(self, other: "Dfa[T]") -> str | None:
+        """
+        Find a shortest string accepted by exactly one of the two
+        DFAs, or None if they are equivalent.
+
+        Only the pairs of states reachable from (q_0, q_0') are
+        visited, and the search stops at the first pair whose states
+        disagree on acceptance. Since the search is breadth first,
+        that pair is reached by a shortest distinguishing string.
+        """
+        if self.alphabet != other.alphabet:
+            raise ValueError("DFAs over different alphabets can't be compared")
+        start = (self.start, other.start)
+        # Each visited pair remembers the pair and character it was
+        # first reached from
+        parent: dict[
+            tuple[State[T], State[T]], tuple[tuple[State[T], State[T]], str] | None
+        ] = {start: None}
+        queue = deque([start])
+        while queue:
+            pair = queue.popleft()
+            if stats.active is not None:
+                stats.active.count("pairs_visited")
+            state_1, state_2 = pair
+            if (state_1 in self.final_set) != (state_2 in other.final_set):
+                witness = []
+                step = parent[pair]
+                while step is not None:
+                    prev, char = step
+                    witness.append(char)
+                    step = parent[prev]
+                return "".join(reversed(witness))
+            for char in self.alphabet:
+                child = (self.delta(state_1, char), other.delta(state_2, char))
+                if child not in parent:
+                    parent[child] = (pair, char)
+                    queue.append(child)
+        return None
 
     def __neg__(self) -> "Dfa[T]":
         """
@@ -0,0 +1,187 @@
+from collections import defaultdict
+from typing import Iterable, Iterator
+
+from python_regex_engine.automata import Nfa, State
+
+
+def indices(mask: int) -> Iterator[int]:
+    """The positions of the bits set in mask, lowest first"""
+    while mask:
+        low = mask & -mask
+        mask ^= low
+        yield low.bit_length() - 1
+
+
+def eps_components(eps_edges: list[int]) -> list[list[int]]:
+    """
+    The strongly connected components of an ε-graph, where
+    eps_edges[i] is the mask of the ε-successors of state i, by an
+    iterative Tarjan's algorithm. Every component comes after all of
+    the components it has an ε-edge to.
+    """
+    order = [-1] * len(eps_edges)
+    low = [0] * len(eps_edges)
+    on_stack = [False] * len(eps_edges)
+    stack: list[int] = []
+    components: list[list[int]] = []
+    # The states being searched from, each with its unvisited successors
+    work: list[tuple[int, Iterator[int]]] = []
+    visited = 0
+
+    def visit(state: int) -> None:
+        nonlocal visited
+        order[state] = low[state] = visited
+        visited += 1
+        stack.append(state)
+        on_stack[state] = True
+        work.append((state, indices(eps_edges[state])))
+
+    for root in range(len(eps_edges)):
+        if order[root] != -1:
+            continue
+        visit(root)
+        while work:
+            state, successors = work[-1]
+            for successor in successors:
+                if order[successor] == -1:
+                    visit(successor)
+                    break
+                if on_stack[successor]:
+                    low[state] = min(low[state], order[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[state])
+                if low[state] == order[state]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == state:
+                            break
+                    components.append(component)
+    return components
+
+
+def gather(
+    eps_edges: list[int], components: list[list[int]], values: list[int]
+) -> list[int]:
+    """
+    For each state i, the OR of values[j] over the states j in the
+    ε-closure of i. The components of eps_components are visited in
+    their order, so every ε-successor outside of a component is done
+    before it, and its result is reused instead of searched again.
+    """
+    result = [0] * len(eps_edges)
+    for component in components:
+        gathered = 0
+        for state in component:
+            gathered |= values[state]
+            # Zero for the members of this component, which are in
+            # `gathered` already
+            for successor in indices(eps_edges[state]):
+                gathered |= result[successor]
+        for state in component:
+            result[state] = gathered
+    return result
+
+
+class BitsetNfa[T]:
+    def __init__(
+        self,
+        states: list[State[T]],
+        start: int,
+        successors: dict[str, list[int]],
+        final_mask: int,
+    ):
+        """
+        An ε-NFA with its states numbered 0..n-1, so that a set of
+        states is an int with bit i set iff state i is in the set.
+
+        successors[c][i] is the ε-closure of δ(i, c), so reading a
+        character is the OR of successors[c][i] over the active bits i,
+        and no ε-closure is computed while matching. The start mask is
+        already ε-closed.
+        """
+        self.states = states
+        self.start = start
+        self.successors = successors
+        self.final_mask = final_mask
+
+    @classmethod
+    def from_nfa(cls, nfa: Nfa[T]) -> "BitsetNfa[T]":
+        # Without the state that nfa uses for "no transition", so the
+        # empty set is 0
+        nothing = nfa.start.identity_element()
+        states = [state for state in nfa.state_set if state != nothing]
+        index = {state: i for i, state in enumerate(states)}
+        eps_edges = [0] * len(states)
+        edges: dict[str, list[int]] = defaultdict(lambda: [0] * len(states))
+        for (state, char), targets in list(nfa.trans_fn.items()):
+            if state not in index:
+                continue
+            mask = 0
+            for target in targets:
+                if target in index:
+                    mask |= 1 << index[target]
+            if char == "":
+                eps_edges[index[state]] |= mask
+            else:
+                edges[char][index[state]] |= mask
+
+        # ε-closure of every single state, built from the closures of
+        # its ε-successors
+        closures = gather(
+            eps_edges,
+            eps_components(eps_edges),
+            [1 << i for i in range(len(states))],
+        )
+
+        def close(mask: int) -> int:
+            result = 0
+            for i in indices(mask):
+                result |= closures[i]
+            return result
+
+        successors = {
+            char: [close(mask) for mask in char_edges]
+            for char, char_edges in edges.items()
+        }
+        for char in nfa.alphabet:
+            successors.setdefault(char, [0] * len(states))
+        final_mask = 0
+        for state in nfa.final_set:
+            final_mask |= 1 << index[state]
+        return cls(states, closures[index[nfa.start]], successors, final_mask)
+
+    def delta_sets(self, active: int, char: str) -> int:
+        succ = self.successors.get(char)
+        if succ is None:
+            return 0
+        result = 0
+        while active:
+            low = active & -active
+            active ^= low
+            result |= succ[low.bit_length() - 1]
+        return result
+
+    def delta_star(self, active: int, input: str) -> int:
+        for char in input:
+            active = self.delta_sets(active, char)
+            if not active:
+                break
+        return active
+
+    def accepts(self, input: str) -> bool:
+        return self.delta_star(self.start, input) & self.final_mask != 0
+
+    def to_mask(self, states: Iterable[State[T]]) -> int:
+        """The bitmask of some of the NFA's states, see to_states"""
+        wanted = set(states)
+        return sum(1 << i for i, state in enumerate(self.states) if state in wanted)
+
+    def to_states(self, active: int) -> set[State[T]]:
+        """Translate a bitmask back to the NFA's own states"""
+        return {state for i, state in enumerate(self.states) if active >> i & 1}
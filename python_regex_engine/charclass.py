@@ -0,0 +1,223 @@
+import sys
+from bisect import bisect_right
+from typing import Iterable, Iterator, Sequence
+
+
+class CharSet:
+    __slots__ = ("intervals",)
+
+    def __init__(self, intervals: Iterable[tuple[int, int]] = ()):
+        """
+        A set of characters, stored as sorted, disjoint and
+        non-adjacent closed intervals of code points, so that large
+        sets (e.g. all of Unicode) are as cheap as small ones.
+        """
+        merged: list[tuple[int, int]] = []
+        for low, high in sorted(intervals):
+            if low > high:
+                continue
+            if merged and low <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+            else:
+                merged.append((low, high))
+        self.intervals = tuple(merged)
+
+    @classmethod
+    def of(cls, chars: str) -> "CharSet":
+        return cls((ord(char), ord(char)) for char in chars)
+
+    @classmethod
+    def range(cls, first: str, last: str) -> "CharSet":
+        return cls([(ord(first), ord(last))])
+
+    def has_code(self, code: int) -> bool:
+        i = bisect_right(self.intervals, (code, sys.maxunicode + 1)) - 1
+        return i >= 0 and self.intervals[i][1] >= code
+
+    def __contains__(self, char: object) -> bool:
+        return isinstance(char, str) and len(char) == 1 and self.has_code(ord(char))
+
+    def __or__(self, other: "CharSet") -> "CharSet":
+        return CharSet(self.intervals + other.intervals)
+
+    def __sub__(self, other: "CharSet") -> "CharSet":
+        result = []
+        others = other.intervals
+        j = 0
+        for low, high in self.intervals:
+            while j < len(others) and others[j][1] < low:
+                j += 1
+            k = j
+            while k < len(others) and others[k][0] <= high:
+                if others[k][0] > low:
+                    result.append((low, others[k][0] - 1))
+                low = others[k][1] + 1
+                k += 1
+            if low <= high:
+                result.append((low, high))
+        return CharSet(result)
+
+    def __and__(self, other: "CharSet") -> "CharSet":
+        return self - (self - other)
+
+    def __bool__(self) -> bool:
+        return bool(self.intervals)
+
+    def __len__(self) -> int:
+        return sum(high - low + 1 for low, high in self.intervals)
+
+    def __iter__(self) -> Iterator[str]:
+        for low, high in self.intervals:
+            for code in range(low, high + 1):
+                yield chr(code)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, CharSet) and self.intervals == other.intervals
+
+    def __hash__(self) -> int:
+        return hash(self.intervals)
+
+    def __repr__(self) -> str:
+        return "CharSet({!r})".format(list(self.intervals))
+
+
+UNICODE = CharSet([(0, sys.maxunicode)])
+BYTES = CharSet([(0, 0xFF)])
+
+
+class _Representatives(dict[int, str]):
+    """
+    str.translate table from code points to class representatives.
+    Each code point is looked up in the segments the first time it is
+    seen, and kept until the table has `limit` of them; later ones are
+    looked up every time, so that a long running matcher over UNICODE
+    can't fill it with every code point.
+    """
+
+    limit = 1 << 14
+
+    def __init__(self, alphabet: "ClassAlphabet"):
+        super().__init__()
+        self.alphabet = alphabet
+
+    def __missing__(self, code: int) -> str:
+        char = chr(code)
+        result = self.alphabet.representative(char) or char
+        if len(self) < self.limit:
+            self[code] = result
+        return result
+
+
+class ClassAlphabet(str):
+    """
+    The alphabet of an automaton over a large character set, such as
+    UNICODE or BYTES.
+
+    The universe is split into the classes of characters that belong
+    to exactly the same CharSets of a pattern; no pattern can tell two
+    characters of one class apart. The string itself holds the first
+    character of each class, and only these representatives label
+    transitions, so the size of the automata depends on the number of
+    classes instead of the size of the universe. Inputs have to be
+    translated to representatives first (see `normalize`).
+
+    All code points are cut into segments: segment i is [starts[i],
+    starts[i + 1]) and belongs to class classes[i], or to no class
+    (-1) if it is outside the universe. Classes are numbered in order
+    of their first segment, whose start is the representative.
+    """
+
+    starts: Sequence[int]
+    classes: Sequence[int]
+    _table: _Representatives
+
+    def __new__(cls, starts: Sequence[int], classes: Sequence[int]) -> "ClassAlphabet":
+        representatives: dict[int, str] = {}
+        for start, i in zip(starts, classes):
+            if i != -1:
+                representatives.setdefault(i, chr(start))
+        self = super().__new__(cls, "".join(representatives.values()))
+        self.starts = starts
+        self.classes = classes
+        self._table = _Representatives(self)
+        return self
+
+    @classmethod
+    def from_sets(cls, universe: CharSet, sets: Iterable[CharSet]) -> "ClassAlphabet":
+        """The classes of universe that no two of the sets cut apart"""
+        sets = sorted({charset & universe for charset in sets}, key=repr)
+        boundaries = {0}
+        for charset in [universe, *sets]:
+            for low, high in charset.intervals:
+                boundaries.add(low)
+                boundaries.add(high + 1)
+        starts = sorted(code for code in boundaries if code <= sys.maxunicode)
+
+        class_ids: dict[tuple[int, ...], int] = {}
+        classes = []
+        for start in starts:
+            if universe.has_code(start):
+                signature = tuple(i for i, s in enumerate(sets) if s.has_code(start))
+                classes.append(class_ids.setdefault(signature, len(class_ids)))
+            else:
+                classes.append(-1)
+        return cls(starts, classes)
+
+    def class_index(self, char: str) -> int:
+        """The class of char, or -1 if it is outside the universe"""
+        return self.classes[bisect_right(self.starts, ord(char)) - 1]
+
+    def representative(self, char: str) -> str | None:
+        i = self.class_index(char)
+        return None if i == -1 else self[i]
+
+    def members(self, charset: CharSet) -> str:
+        """The representatives of the classes in charset"""
+        return "".join(char for char in self if char in charset)
+
+    def segments(self) -> Iterator[tuple[int, str | None]]:
+        """Each segment's start and representative (None if outside)"""
+        for start, i in zip(self.starts, self.classes):
+            yield start, (None if i == -1 else self[i])
+
+    def normalize(self, text: str) -> str:
+        """
+        Replace every character by its representative. Characters
+        outside the universe are kept, and as they aren't in the
+        alphabet, automata reject them.
+        """
+        return text.translate(self._table)
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, ClassAlphabet)
+            and str(self) == str(other)
+            and list(self.starts) == list(other.starts)
+            and list(self.classes) == list(other.classes)
+        )
+
+    def __ne__(self, other: object) -> bool:
+        return not self == other
+
+    __hash__ = str.__hash__
+
+
+def normalize(alphabet: str, text: str) -> str:
+    """See ClassAlphabet.normalize; other alphabets need no translation"""
+    if isinstance(alphabet, ClassAlphabet):
+        return alphabet.normalize(text)
+    return text
+
+
+def segments(alphabet: str) -> list[tuple[int, str | None]]:
+    """See ClassAlphabet.segments; otherwise each character is one"""
+    if isinstance(alphabet, ClassAlphabet):
+        return list(alphabet.segments())
+    result: list[tuple[int, str | None]] = [(0, None)]
+    for char in sorted(set(alphabet)):
+        code = ord(char)
+        if result[-1][0] == code:
+            result.pop()
+        result.append((code, char))
+        result.append((code + 1, None))
+    return result
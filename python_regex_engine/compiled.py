@@ -0,0 +1,262 @@
+from array import array
+from functools import cached_property
+from typing import TYPE_CHECKING, Callable, Sequence
+
+from python_regex_engine import stats
+from python_regex_engine.automata import Dfa
+from python_regex_engine.charclass import ClassAlphabet, segments
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def _is_reindexed[T](dfa: Dfa[T]) -> bool:
+    """Are the states already 0..n-1, so that the names can be kept?"""
+    return all(
+        type(state) is int and 0 <= state < len(dfa.state_set)
+        for state in dfa.state_set
+    )
+
+
+class CompiledDfa:
+    def __init__(
+        self,
+        start: int,
+        n_classes: int,
+        class_of: dict[str, int],
+        table: Sequence[int],
+        accepting: int,
+        alphabet: ClassAlphabet | None = None,
+        dead: int | None = None,
+    ):
+        """
+        A DFA flattened into integer arrays for matching.
+
+        States are 0..n-1 and characters are mapped to character
+        classes (characters whose columns in δ are identical share a
+        class). δ(q, c) is then table[q * n_classes + class_of[c]], and
+        q is accepting iff bit q of `accepting` is set.
+
+        Characters outside the alphabet fall into an extra class that
+        leads to a non-accepting sink state, so the matching loop needs
+        no special cases.
+
+        For a ClassAlphabet, `class_of` only has the representatives,
+        and inputs are normalized before they are matched.
+
+        Bit q of `dead` is set iff no accepting state can be reached
+        from q, so a scan can stop as soon as it enters such a state.
+        It is worked out from the table unless given (serialize stores
+        it, so that loading doesn't have to build the predecessors of
+        every state).
+        """
+        self.start = start
+        self.n_classes = n_classes
+        self.class_of = class_of
+        self.table = table
+        self.accepting = accepting
+        self.other_class = n_classes - 1
+        self.alphabet = alphabet
+        self.dead = self._dead_states() if dead is None else dead
+
+    def _dead_states(self) -> int:
+        predecessors: list[list[int]] = [[] for _ in range(len(self))]
+        for i, target in enumerate(self.table):
+            predecessors[target].append(i // self.n_classes)
+        live = self.accepting
+        stack = [state for state in range(len(self)) if live >> state & 1]
+        while stack:
+            for source in predecessors[stack.pop()]:
+                if not live >> source & 1:
+                    live |= 1 << source
+                    stack.append(source)
+        return ((1 << len(self)) - 1) & ~live
+
+    @classmethod
+    @stats.stage("compile")
+    def from_dfa[T](cls, dfa: Dfa[T], restart: bool = False) -> "CompiledDfa":
+        """
+        With `restart`, characters outside the alphabet lead back to
+        the start state instead of the sink. This is what a scanner
+        for Σ*R wants: no match can span such a character, but one
+        can start right after it.
+        """
+        n_states = len(dfa.state_set)
+        if _is_reindexed(dfa):
+            dfa_int: Dfa[int] = dfa  # type: ignore[assignment]
+        else:
+            dfa_int = dfa.reindex()
+        columns: dict[tuple[int, ...], int] = {}
+        class_of: dict[str, int] = {}
+        for char in dfa_int.alphabet:
+            column = tuple(dfa_int.delta(state, char) for state in range(n_states))
+            class_of[char] = columns.setdefault(column, len(columns))
+
+        # The sink state and the class of unknown characters
+        sink = n_states
+        n_classes = len(columns) + 1
+        table = array("l", [sink]) * ((n_states + 1) * n_classes)
+        for column, char_class in columns.items():
+            for state, target in enumerate(column):
+                table[state * n_classes + char_class] = target
+        if restart:
+            for state in range(n_states):
+                table[state * n_classes + n_classes - 1] = dfa_int.start
+
+        accepting = 0
+        for state in dfa_int.final_set:
+            accepting |= 1 << state
+        alphabet = dfa_int.alphabet
+        return cls(
+            dfa_int.start,
+            n_classes,
+            class_of,
+            table,
+            accepting,
+            alphabet if isinstance(alphabet, ClassAlphabet) else None,
+        )
+
+    def normalize(self, input: str) -> str:
+        """See ClassAlphabet.normalize"""
+        return input if self.alphabet is None else self.alphabet.normalize(input)
+
+    def delta(self, state: int, char: str) -> int:
+        """δ for a single (not yet normalized) character"""
+        char_class = self.class_of.get(self.normalize(char), self.other_class)
+        return self.table[state * self.n_classes + char_class]
+
+    def segments(self) -> list[tuple[int, int]]:
+        """
+        All code points cut into segments whose characters share a
+        class: segment i starts at result[i][0] and has the class
+        result[i][1]. Used to line up the classes of two DFAs.
+        """
+        alphabet = "".join(self.class_of) if self.alphabet is None else self.alphabet
+        return [
+            (
+                start,
+                (
+                    self.class_of.get(char, self.other_class)
+                    if char
+                    else self.other_class
+                ),
+            )
+            for start, char in segments(alphabet)
+        ]
+
+    def delta_star(self, state: int, input: str) -> int:
+        table = self.table
+        n_classes = self.n_classes
+        lookup = self.class_of.get
+        other = self.other_class
+        if stats.active is not None:
+            stats.active.count("transitions", len(input))
+        for char in self.normalize(input):
+            state = table[state * n_classes + lookup(char, other)]
+        return state
+
+    def is_final(self, state: int) -> bool:
+        return bool(self.accepting >> state & 1)
+
+    def is_dead(self, state: int) -> bool:
+        return bool(self.dead >> state & 1)
+
+    def accepts(self, input: str) -> bool:
+        return self.is_final(self.delta_star(self.start, input))
+
+    def __len__(self) -> int:
+        """The number of states, including the sink"""
+        return len(self.table) // self.n_classes
+
+    @cached_property
+    def _numpy_tables(
+        self,
+    ) -> tuple[Callable[["np.ndarray"], "np.ndarray"], "np.ndarray", "np.ndarray"]:
+        """
+        A function from an array of code points to their classes (a
+        lookup table up to the last character of the alphabet, or a
+        binary search of the segments), the transition table
+        with an extra padding class that leaves every state where it
+        is, and the accepting states as a boolean array.
+        """
+        import numpy as np
+
+        classify: Callable[[np.ndarray], np.ndarray]
+        if self.alphabet is not None:
+            starts = np.asarray(self.alphabet.starts, dtype=np.int64)
+            segment_classes = np.array(
+                [
+                    self.other_class if i == -1 else self.class_of[self.alphabet[i]]
+                    for i in self.alphabet.classes
+                ],
+                dtype=np.intp,
+            )
+
+            def classify(codes: np.ndarray) -> np.ndarray:
+                result: np.ndarray = segment_classes[
+                    np.searchsorted(starts, codes, side="right") - 1
+                ]
+                return result
+
+        else:
+            class_by_code = np.full(
+                max(map(ord, self.class_of), default=0) + 2,
+                self.other_class,
+                dtype=np.intp,
+            )
+            for char, char_class in self.class_of.items():
+                class_by_code[ord(char)] = char_class
+
+            def classify(codes: np.ndarray) -> np.ndarray:
+                result: np.ndarray = class_by_code[
+                    np.minimum(codes, len(class_by_code) - 1)
+                ]
+                return result
+
+        table = np.empty((len(self), self.n_classes + 1), dtype=np.intp)
+        table[:, :-1] = np.asarray(self.table).reshape(len(self), self.n_classes)
+        table[:, -1] = np.arange(len(self))
+
+        accepting = np.array(
+            [self.is_final(state) for state in range(len(self))], dtype=bool
+        )
+        return classify, table, accepting
+
+    def accepts_many(self, strings: Sequence[str]) -> "np.ndarray | list[bool]":
+        """
+        Run every string at once. With NumPy the batch is encoded as
+        a (strings × longest string) matrix of character classes, and
+        each column is one fancy-indexing step into the transition
+        table; the result is a boolean array. Without NumPy, this is
+        a list of `accepts` results.
+
+        NumPy is only imported here, so that importing the package
+        doesn't pay for it.
+        """
+        try:
+            import numpy as np
+        except ImportError:  # NumPy is optional
+            return [self.accepts(string) for string in strings]
+        classify, table, accepting = self._numpy_tables
+        n_strings = len(strings)
+        lengths = np.fromiter(map(len, strings), dtype=np.intp, count=n_strings)
+        width = int(lengths.max()) if n_strings else 0
+
+        # Class of every character of every string, in one flat array
+        class_type = np.min_scalar_type(self.n_classes)
+        codes = np.frombuffer(
+            "".join(strings).encode("utf-32-le", "surrogatepass"), dtype=np.uint32
+        )
+        classes = classify(codes)
+
+        # Shorter strings are padded with the padding class. A boolean
+        # mask assignment fills the matrix row by row, which is the
+        # order of the joined strings.
+        matrix = np.full((n_strings, width), self.n_classes, dtype=class_type)
+        matrix[np.arange(width) < lengths[:, None]] = classes
+
+        states = np.full(n_strings, self.start, dtype=np.intp)
+        for column in np.ascontiguousarray(matrix.T):
+            states = table[states, column]
+        result: np.ndarray = accepting[states]
+        return result
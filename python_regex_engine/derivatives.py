@@ -0,0 +1,258 @@
+import sys
+from collections import deque
+from itertools import count
+from typing import Iterator
+from weakref import WeakValueDictionary
+
+from python_regex_engine import stats
+from python_regex_engine.automata import ALPHABET, TRANSITION_BYTES, Budget, Dfa
+from python_regex_engine.charclass import CharSet, ClassAlphabet
+from python_regex_engine.monoids import Set
+from python_regex_engine.parser import parse
+
+EMPTY = "∅"
+EPSILON = "ε"
+CHARS = "chars"
+CONCAT = "concat"
+UNION = "union"
+STAR = "star"
+
+
+class Regex:
+    """
+    A node of a regex AST. Nodes are hash-consed: the smart
+    constructors below return the same object for the same operator
+    and arguments, so two nodes are equal iff they are identical, and
+    comparing or hashing a node is O(1) whatever its size.
+    """
+
+    __slots__ = ("op", "args", "nullable", "serial", "derivatives", "__weakref__")
+
+    op: str
+    args: tuple[object, ...]
+    nullable: bool
+    # Creation order, to sort the alternatives of a union
+    serial: int
+    derivatives: dict[str, "Regex"]
+
+    def __repr__(self) -> str:
+        if self.op in (EMPTY, EPSILON):
+            return self.op
+        if self.op == CHARS:
+            return repr(self.args[0])
+        if self.op == STAR:
+            return "({!r})*".format(self.args[0])
+        separator = "" if self.op == CONCAT else "|"
+        return "({})".format(separator.join(map(repr, self.args)))
+
+
+_nodes: WeakValueDictionary[tuple[object, ...], Regex] = WeakValueDictionary()
+_serials = count()
+
+
+def _node(op: str, args: tuple[object, ...], nullable: bool) -> Regex:
+    key = (op, *args)
+    node = _nodes.get(key)
+    if node is None:
+        node = Regex()
+        node.op = op
+        node.args = args
+        node.nullable = nullable
+        node.serial = next(_serials)
+        node.derivatives = {}
+        _nodes[key] = node
+    return node
+
+
+def empty() -> Regex:
+    return _node(EMPTY, (), False)
+
+
+def epsilon() -> Regex:
+    return _node(EPSILON, (), True)
+
+
+def chars(charset: CharSet) -> Regex:
+    return _node(CHARS, (charset,), False) if charset else empty()
+
+
+def concat(left: Regex, right: Regex) -> Regex:
+    """∅r = r∅ = ∅, εr = rε = r, and (rs)t is r(st)"""
+    if left.op == EMPTY or right.op == EMPTY:
+        return empty()
+    if left.op == EPSILON:
+        return right
+    if right.op == EPSILON:
+        return left
+    factors = []
+    while left.op == CONCAT:
+        first, left = left.args  # type: ignore[assignment]
+        factors.append(first)
+    factors.append(left)
+    for factor in reversed(factors):
+        assert isinstance(factor, Regex)
+        nullable = factor.nullable and right.nullable
+        right = _node(CONCAT, (factor, right), nullable)
+    return right
+
+
+def union(*alternatives: Regex) -> Regex:
+    """
+    Nested unions are flattened, ∅ is dropped and duplicates are
+    removed (associativity, identity and idempotence), and the rest
+    is sorted (commutativity). Character sets are joined into one.
+    """
+    flat: set[Regex] = set()
+    charset = CharSet()
+    for alternative in alternatives:
+        for item in _alternatives(alternative):
+            if item.op == CHARS:
+                charset |= item.args[0]  # type: ignore[operator]
+            elif item.op != EMPTY:
+                flat.add(item)
+    if charset:
+        flat.add(chars(charset))
+    if not flat:
+        return empty()
+    if len(flat) == 1:
+        return flat.pop()
+    args = tuple(sorted(flat, key=lambda node: node.serial))
+    return _node(UNION, args, any(node.nullable for node in args))
+
+
+def _alternatives(regex: Regex) -> Iterator[Regex]:
+    if regex.op == UNION:
+        yield from regex.args  # type: ignore[misc]
+    else:
+        yield regex
+
+
+def star(inner: Regex) -> Regex:
+    """r** = r*, and ∅* = ε* = ε"""
+    if inner.op in (EMPTY, EPSILON):
+        return epsilon()
+    if inner.op == STAR:
+        return inner
+    return _node(STAR, (inner,), True)
+
+
+class RegexBuilder:
+    """The Builder that translates a parsed regex to a Regex AST"""
+
+    def symbol(self, char: str) -> Regex:
+        return chars(CharSet.of(char))
+
+    def charset(self, charset: CharSet) -> Regex:
+        return chars(charset)
+
+    def empty(self) -> Regex:
+        return epsilon()
+
+    def concat(self, left: Regex, right: Regex) -> Regex:
+        return concat(left, right)
+
+    def union(self, left: Regex, right: Regex) -> Regex:
+        return union(left, right)
+
+    def star(self, inner: Regex) -> Regex:
+        return star(inner)
+
+    def plus(self, inner: Regex) -> Regex:
+        # The nodes are shared, so this doesn't copy inner
+        return concat(inner, star(inner))
+
+
+def derivative(regex: Regex, char: str) -> Regex:
+    """
+    Brzozowski's derivative: the regex for {w | char + w in L(regex)}
+    """
+    try:
+        return regex.derivatives[char]
+    except KeyError:
+        pass
+    result: Regex
+    if regex.op in (EMPTY, EPSILON):
+        result = empty()
+    elif regex.op == CHARS:
+        result = epsilon() if char in regex.args[0] else empty()  # type: ignore[operator]
+    elif regex.op == CONCAT:
+        left, right = regex.args
+        assert isinstance(left, Regex) and isinstance(right, Regex)
+        # (r|s)t is written rt|st, so that the alternatives of every
+        # derivative stay at the top, where union can deduplicate them
+        head = derivative(left, char)
+        result = union(*[concat(alt, right) for alt in _alternatives(head)])
+        if left.nullable:
+            result = union(result, derivative(right, char))
+    elif regex.op == UNION:
+        result = union(*[derivative(alt, char) for alt in _alternatives(regex)])
+    else:
+        (inner,) = regex.args
+        assert isinstance(inner, Regex)
+        head = derivative(inner, char)
+        result = union(*[concat(alt, regex) for alt in _alternatives(head)])
+    regex.derivatives[char] = result
+    return result
+
+
+def _charsets(regex: Regex) -> Iterator[CharSet]:
+    seen = set()
+    stack = [regex]
+    while stack:
+        node = stack.pop()
+        if node in seen:
+            continue
+        seen.add(node)
+        for arg in node.args:
+            if isinstance(arg, CharSet):
+                yield arg
+            elif isinstance(arg, Regex):
+                stack.append(arg)
+
+
+@stats.stage("derivatives")
+def to_dfa(
+    regex: Regex, alphabet: str | CharSet = ALPHABET, budget: Budget | None = None
+) -> Dfa[int]:
+    """
+    Build a DFA whose states are the derivatives of regex. Thanks to
+    the normalizing constructors there are finitely many, and since
+    each is a regex for the language still to be read, equivalent
+    states are rare: the DFA is usually minimal or close to it.
+
+    States are numbered in breadth first order from the start. See
+    Nfa.to_dfa for the budget.
+    """
+    if isinstance(alphabet, CharSet):
+        alphabet = ClassAlphabet.from_sets(alphabet, _charsets(regex))
+    names = {regex: 0}
+    queue = deque([regex])
+    trans_fn: dict[tuple[int, str], int] = {}
+    size = sys.getsizeof(regex) + sys.getsizeof(regex.args)
+    size += len(alphabet) * TRANSITION_BYTES
+    while queue:
+        state = queue.popleft()
+        for char in alphabet:
+            target = derivative(state, char)
+            if target not in names:
+                if budget is not None:
+                    size += sys.getsizeof(target) + sys.getsizeof(target.args)
+                    size += len(alphabet) * TRANSITION_BYTES
+                    budget.check(len(names) + 1, size)
+                names[target] = len(names)
+                queue.append(target)
+            trans_fn[(names[state], char)] = names[target]
+    if stats.active is not None:
+        stats.active.count("derivative_states", len(names))
+    finals = [name for state, name in names.items() if state.nullable]
+    result: Dfa[int] = Dfa(
+        0, Set(list(names.values())), alphabet, trans_fn, Set(finals)
+    )
+    return result
+
+
+def regex_to_dfa(
+    text: str, alphabet: str | CharSet = ALPHABET, budget: Budget | None = None
+) -> Dfa[int]:
+    """Parse a regular expression and build its derivative DFA"""
+    return to_dfa(parse(text, RegexBuilder()), alphabet, budget)
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from typing import NamedTuple, Sequence
+
+from python_regex_engine.automata import Nfa
+from python_regex_engine.bitset import BitsetNfa
+from python_regex_engine.charclass import normalize, segments
+
+
+class LazyCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    fallbacks: int
+    maxsize: int
+    currsize: int
+
+
+class LazyDfa[T]:
+    def __init__(self, nfa: Nfa[T], cache_size: int = 1024, thrash_limit: int = 4):
+        """
+        Run an NFA as a DFA whose states are built on demand.
+
+        A DFA state is an ε-closed set of NFA states, stored as a
+        BitsetNfa mask, and δ is only computed the first time the
+        input reaches a (state, char) pair. At most `cache_size` DFA
+        states are kept; the least recently used one is evicted to
+        make room.
+
+        If, after the cache has started evicting, fewer than
+        `thrash_limit` characters are read per cache miss, building
+        DFA states is costing more than it saves, and the rest of the
+        input is run through a plain NFA simulation.
+        """
+        assert cache_size > 0
+        self.nfa = BitsetNfa.from_nfa(nfa)
+        self.alphabet = nfa.alphabet
+        self.cache_size = cache_size
+        self.thrash_limit = thrash_limit
+        self.start = self.nfa.start
+        self._cache: OrderedDict[int, dict[str, int]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fallbacks = 0
+
+    def delta(self, state: int, char: str) -> int:
+        """δ for a single (not yet normalized) character"""
+        return self._delta(state, normalize(self.alphabet, char))
+
+    def _delta(self, state: int, char: str) -> int:
+        transitions = self._cache.get(state)
+        if transitions is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+            transitions = self._cache[state] = {}
+        else:
+            self._cache.move_to_end(state)
+        try:
+            target = transitions[char]
+            self.hits += 1
+        except KeyError:
+            self.misses += 1
+            target = transitions[char] = self.nfa.delta_sets(state, char)
+        return target
+
+    def delta_star(self, state: int, input: str) -> int:
+        start_misses = self.misses
+        start_evictions = self.evictions
+        input = normalize(self.alphabet, input)
+        for i, char in enumerate(input):
+            state = self._delta(state, char)
+            if (
+                self.evictions != start_evictions
+                and i >= self.cache_size
+                and (self.misses - start_misses) * self.thrash_limit > i
+            ):
+                self.fallbacks += 1
+                return self.nfa.delta_star(state, input[i + 1 :])
+        return state
+
+    def is_final(self, state: int) -> bool:
+        return state & self.nfa.final_mask != 0
+
+    def is_dead(self, state: int) -> bool:
+        """
+        Is state the empty set? If every NFA state can reach a final
+        one (e.g. after optimize.prune) that is the only dead state.
+        """
+        return state == 0
+
+    def accepts(self, input: str) -> bool:
+        return self.is_final(self.delta_star(self.start, input))
+
+    def segments(self) -> list[tuple[int, str | None]]:
+        """
+        See CompiledDfa.segments; the classes are the representatives,
+        and None for characters outside the alphabet
+        """
+        return segments(self.alphabet)
+
+    def accepts_many(self, strings: Sequence[str]) -> list[bool]:
+        return [self.accepts(string) for string in strings]
+
+    def cache_info(self) -> LazyCacheInfo:
+        return LazyCacheInfo(
+            self.hits,
+            self.misses,
+            self.evictions,
+            self.fallbacks,
+            self.cache_size,
+            len(self._cache),
+        )
+
+    def cache_clear(self) -> None:
+        self._cache.clear()
+        self.hits = self.misses = self.evictions = self.fallbacks = 0
@@ -1,60 +1,75 @@
-from typing import Iterator, Self
+from typing import AbstractSet, Any, Iterable, Iterator, Self
+from weakref import WeakValueDictionary
 
 from pymonad.monoid import Monoid  # type: ignore[import-untyped]
 
 
-class Set[T](Monoid):  # type: ignore[no-any-unimported, misc]
-    def __init__(self, val: set[T] | list[T] | tuple[T] | T = set()) -> None:
-        self.value: set[T]
-        if isinstance(val, set) or isinstance(val, list) or isinstance(val, tuple):
-            self.value = set(val)
-        else:
-            self.value = {val}
-        self.__iadd__ = self.__add__
+class Set[T]:
+    """
+    An immutable set, such as a set of states or a state of a DFA
+    built by the subset construction. Sets are interned: building a
+    set equal to one that is alive returns that one, so equal sets
+    share their memory (the many "no transition" sets of an Nfa are
+    all the same object), and the hash is computed only once.
 
-    def discard(self, item: T) -> None:
-        self.val.discard(item)
+    Like the pymonad monoids, + is union and Set() the identity, but
+    Monoid isn't a base class: its instances would carry a __dict__.
+    """
 
-    def issubset(self, other: Self | set[T]) -> bool:
-        if isinstance(other, set):
-            return self.value.issubset(other)
-        return self.value.issubset(other.value)
+    __slots__ = ("value", "_hash", "__weakref__")
 
-    def issuperset(self, other: Self | set[T]) -> bool:
-        if isinstance(other, set):
-            return self.value.issuperset(other)
-        return self.value.issuperset(other.value)
+    value: frozenset[T]
+    _hash: int
 
-    def intersection(self: Self, other: Self) -> Self:
-        return Set(self.value.intersection(other.value))
+    def __new__(cls, val: "Set[T] | Iterable[T] | T" = frozenset()) -> "Set[T]":
+        if isinstance(val, Set):
+            return val
+        if isinstance(val, (set, frozenset, list, tuple)):
+            value = frozenset(val)
+        else:
+            value = frozenset((val,))
+        result = _sets.get(value)
+        if result is None:
+            result = object.__new__(cls)
+            result.value = value
+            result._hash = hash(value)
+            _sets[value] = result
+        return result
 
-    def addition_operation(self: Self, other: Self) -> Self:
-        return Set(self.value.union(other.value))
+    def __reduce__(self) -> tuple[type, tuple[frozenset[T]]]:
+        return Set, (self.value,)
 
-    def union(self: Self, *others: Self) -> Self:
-        result: Set[T] = self
-        for other in others:
-            result += result + other
-        return result
+    def issubset(self, other: "Set[T] | AbstractSet[T]") -> bool:
+        return self.value.issubset(_value(other))
 
-    def identity_element(self) -> Self:
-        return Set()
+    def issuperset(self, other: "Set[T] | AbstractSet[T]") -> bool:
+        return self.value.issuperset(_value(other))
 
-    def copy(self) -> Self:
-        return Set(self.value.copy())
+    def intersection(self, other: "Set[T] | AbstractSet[T]") -> "Set[T]":
+        return Set(self.value.intersection(_value(other)))
 
-    def pop(self) -> T:
-        return self.value.pop()
+    def addition_operation(self, other: "Set[T]") -> "Set[T]":
+        return self.union(other)
 
-    def add(self, x: T) -> None:
-        self.value.add(x)
+    def __add__(self, other: "Set[T]") -> "Set[T]":
+        return self.union(other)
 
-    def difference(self, x: Self) -> Self:
-        return Set(self.value - x.value)
+    def union(self, *others: "Set[T] | AbstractSet[T]") -> "Set[T]":
+        value = self.value.union(*[_value(other) for other in others])
+        return self if len(value) == len(self.value) else Set(value)
 
-    def __sub__(self, x: Self) -> Self:
+    def identity_element(self) -> "Set[T]":
+        return Set()
+
+    def difference(self, x: "Set[T] | AbstractSet[T]") -> "Set[T]":
+        return Set(self.value - _value(x))
+
+    def __sub__(self, x: "Set[T] | AbstractSet[T]") -> "Set[T]":
         return self.difference(x)
 
+    def __contains__(self, item: object) -> bool:
+        return item in self.value
+
     def __iter__(self) -> Iterator[T]:
         return self.value.__iter__()
 
@@ -67,58 +82,82 @@ class Set[T](Monoid):  # type: ignore[no-any-unimported, misc]
     def __repr__(self) -> str:
         if len(self.value) == 0:
             return "∅"
-        return "{}".format(self.value)
+        return "{}".format(set(self.value))
 
-    def __eq__(self: Self, other: object) -> bool:
+    def __eq__(self, other: object) -> bool:
+        if self is other:
+            return True
         if isinstance(other, Set):
             return self.value == other.value
-        elif isinstance(other, set):
+        elif isinstance(other, (set, frozenset)):
             return self.value == other
         return False
 
-    def __hash__(self: Self) -> int:
-        """
-        A DANGEROUS thing to do, if we are using this function
-        (which is done implicitly in dict keys) we need to make
-        sure that the set itself doesn't change.
-        """
-        return hash(tuple(self.value))
+    def __hash__(self) -> int:
+        return self._hash
 
 
-class Sum(Monoid[int]):  # type: ignore[no-any-unimported, misc]
-    def __init__(self, val: int = 0) -> None:
-        self.value = val
-        self.__iadd__ = self.__add__
+def _value[T](x: Set[T] | AbstractSet[T]) -> AbstractSet[T]:
+    return x.value if isinstance(x, Set) else x
+
+
+_sets: WeakValueDictionary[frozenset[Any], Set[Any]] = WeakValueDictionary()
+
+
+class Sum:
+    """
+    An immutable int under addition, used to name the states of
+    Thompson NFAs. Interned like Set, so a state that appears in many
+    transitions is stored once.
+    """
+
+    __slots__ = ("value", "__weakref__")
+
+    value: int
+
+    def __new__(cls, val: int = 0) -> "Sum":
+        result = _sums.get(val)
+        if result is None:
+            result = object.__new__(cls)
+            result.value = val
+            _sums[val] = result
+        return result
+
+    def __reduce__(self) -> tuple[type, tuple[int]]:
+        return Sum, (self.value,)
 
     def __format__(self, format_spec: str) -> str:
         return ("{:" + format_spec + "}").format(str(self))
 
-    def addition_operation(self: Self, other: Self | int) -> Self:
+    def addition_operation(self, other: "Sum | int") -> "Sum":
         if isinstance(other, int):
-            return self + Sum(other)  # type: ignore[no-any-return]
+            return Sum(self.value + other)
         return Sum(self.value + other.value)
 
+    def __add__(self, other: "Sum | int") -> "Sum":
+        return self.addition_operation(other)
+
     def identity_element(self) -> "Sum":
         return Sum()
 
     def __repr__(self) -> str:
         return "{}".format(self.value)
 
-    def __eq__(self: Self, other: object) -> bool:
-        if isinstance(other, Sum):
-            return self.value == other.value
-        elif isinstance(other, int):
-            return self.value == other
-        return False
+    def __eq__(self, other: object) -> bool:
+        # Not equal to the int: a Set of them would be interned as the
+        # Set of those ints, which is no Thompson state
+        return self is other or (isinstance(other, Sum) and self.value == other.value)
 
     def __hash__(self) -> int:
         return hash(self.value)
 
 
+_sums: WeakValueDictionary[int, Sum] = WeakValueDictionary()
+
+
 class Product(Monoid[int]):  # type: ignore[no-any-unimported, misc]
     def __init__(self, val: int = 1) -> None:
         self.value = val
-        self.__iadd__ = self.__add__
 
     def addition_operation(self: Self, other: Self) -> Self:
         return Product(self.value * other.value)
@@ -135,3 +174,43 @@ class Product(Monoid[int]):  # type: ignore[no-any-unimported, misc]
         elif isinstance(other, int):
             return self.value == other
         return False
+
+
+class Transition(Monoid[tuple[int, ...] | None]):  # type: ignore[no-any-unimported, misc]
+    def __init__(self, val: tuple[int, ...] | None = None) -> None:
+        """
+        The effect of reading a string on every state of a DFA with
+        states 0..n-1: the string takes state q to val[q]. Adding
+        two transitions reads one string and then the other, which
+        is associative, so the transition of a long string can be
+        put together from those of its pieces in any grouping.
+
+        The identity (reading nothing) is stored as None, so that it
+        doesn't depend on n.
+        """
+        self.value = val
+
+    def addition_operation(self: Self, other: Self) -> Self:
+        if self.value is None:
+            return other
+        if other.value is None:
+            return self
+        after = other.value
+        return Transition(tuple([after[state] for state in self.value]))
+
+    def identity_element(self) -> "Transition":
+        return Transition()
+
+    def __call__(self, state: int) -> int:
+        return state if self.value is None else self.value[state]
+
+    def __repr__(self) -> str:
+        return "id" if self.value is None else "{}".format(self.value)
+
+    def __eq__(self: Self, other: object) -> bool:
+        if isinstance(other, Transition):
+            return self.value == other.value
+        return False
+
+    def __hash__(self) -> int:
+        return hash(self.value)
@@ -0,0 +1,215 @@
+from collections import defaultdict
+from typing import Any, Callable, Hashable, NamedTuple, Sequence
+
+from python_regex_engine import stats
+from python_regex_engine.automata import Nfa, State
+from python_regex_engine.bitset import eps_components, gather, indices
+from python_regex_engine.monoids import Set
+
+Edges = dict[tuple[State, str], set[State]]
+
+
+class PassReport(NamedTuple):
+    """The size of an NFA before and after one simplification pass"""
+
+    name: str
+    states_before: int
+    edges_before: int
+    states_after: int
+    edges_after: int
+
+    def __str__(self) -> str:
+        return "{}: {} -> {} states, {} -> {} edges".format(
+            self.name,
+            self.states_before,
+            self.states_after,
+            self.edges_before,
+            self.edges_after,
+        )
+
+
+def _edges[T](nfa: Nfa[T]) -> Edges:
+    """
+    The transitions of nfa, without the identity state that its
+    trans_fn uses for "no transition"
+    """
+    nothing = nfa.start.identity_element()
+    result: Edges = {}
+    for (state, char), targets in list(nfa.trans_fn.items()):
+        if state == nothing:
+            continue
+        real = {target for target in targets if target != nothing}
+        if real:
+            result[(state, char)] = real
+    return result
+
+
+def _states[T](nfa: Nfa[T]) -> list[State[T]]:
+    nothing = nfa.start.identity_element()
+    return [state for state in nfa.state_set if state != nothing]
+
+
+def _size[T](nfa: Nfa[T]) -> tuple[int, int]:
+    return len(_states(nfa)), sum(map(len, _edges(nfa).values()))
+
+
+def _build[T](
+    nfa: Nfa[T], states: Sequence[State[T]], edges: Edges, finals: set[State[T]]
+) -> Nfa[T]:
+    """A new NFA like nfa, with only the given states, edges and finals"""
+    result: Nfa[T] = Nfa(
+        nfa.start,
+        Set(list(states)),
+        nfa.alphabet,
+        {key: Set(targets) for key, targets in edges.items()},
+        Set(finals),
+    )
+    return result
+
+
+def remove_epsilons[T](nfa: Nfa[T]) -> Nfa[T]:
+    """
+    ε-NFA -> NFA: δ'(q, c) is δ(p, c) for all p in the ε-closure of
+    q, and q is final iff its ε-closure has a final state. Only the
+    start and the targets of δ are kept, as no other state can be
+    reached without ε-edges.
+
+    δ' and the final states are gathered over the components of the
+    ε-graph (see bitset.gather), so states share the work for the
+    parts of their ε-closures that overlap.
+    """
+    states = _states(nfa)
+    index = {state: i for i, state in enumerate(states)}
+    eps_edges = [0] * len(states)
+    char_edges: dict[str, list[int]] = {
+        char: [0] * len(states) for char in nfa.alphabet
+    }
+    kept = 1 << index[nfa.start]
+    for (state, char), targets in _edges(nfa).items():
+        mask = 0
+        for target in targets:
+            mask |= 1 << index[target]
+        if char == "":
+            eps_edges[index[state]] |= mask
+        else:
+            char_edges.setdefault(char, [0] * len(states))[index[state]] |= mask
+            kept |= mask
+
+    components = eps_components(eps_edges)
+    final = [int(state in nfa.final_set) for state in states]
+    finals = {
+        states[i]
+        for i, gathered in enumerate(gather(eps_edges, components, final))
+        if gathered and kept >> i & 1
+    }
+    new_edges: Edges = {}
+    for char, edges in char_edges.items():
+        for i, gathered in enumerate(gather(eps_edges, components, edges)):
+            if gathered and kept >> i & 1:
+                new_edges[(states[i], char)] = {states[j] for j in indices(gathered)}
+    return _build(nfa, [states[i] for i in indices(kept)], new_edges, finals)
+
+
+def prune[T](nfa: Nfa[T]) -> Nfa[T]:
+    """
+    Drop the states that can't be reached from the start state, and
+    those from which no final state can be reached.
+    """
+    edges = _edges(nfa)
+    successors: dict[State[T], set[State[T]]] = defaultdict(set)
+    predecessors: dict[State[T], set[State[T]]] = defaultdict(set)
+    for (source, _), targets in edges.items():
+        successors[source] |= targets
+        for target in targets:
+            predecessors[target].add(source)
+
+    def closure(
+        start: set[State[T]], step: dict[State[T], set[State[T]]]
+    ) -> set[State[T]]:
+        seen = set(start)
+        stack = list(start)
+        while stack:
+            for next_state in step[stack.pop()]:
+                if next_state not in seen:
+                    seen.add(next_state)
+                    stack.append(next_state)
+        return seen
+
+    live = closure({nfa.start}, successors) & closure(set(nfa.final_set), predecessors)
+    live.add(nfa.start)
+    new_edges = {
+        (source, char): targets & live
+        for (source, char), targets in edges.items()
+        if source in live and targets & live
+    }
+    finals = {state for state in nfa.final_set if state in live}
+    return _build(nfa, [s for s in _states(nfa) if s in live], new_edges, finals)
+
+
+def merge_equivalent[T](nfa: Nfa[T]) -> Nfa[T]:
+    """
+    Merge states that agree on being final and have the same
+    transitions, which means they accept the same language. Merging
+    can make more states alike, so this is repeated until nothing
+    changes. Each group of states is named after its first member.
+    """
+    states = _states(nfa)
+    edges = _edges(nfa)
+    outgoing: dict[State[T], list[tuple[str, set[State[T]]]]] = defaultdict(list)
+    for (source, char), targets in edges.items():
+        outgoing[source].append((char, targets))
+    rename = {state: state for state in states}
+    while True:
+        groups: dict[Hashable, State[T]] = {}
+        new_rename = {}
+        for state in states:
+            signature = (
+                state in nfa.final_set,
+                frozenset(
+                    (char, frozenset(rename[target] for target in targets))
+                    for char, targets in outgoing[state]
+                ),
+            )
+            new_rename[state] = groups.setdefault(signature, state)
+        if len(set(new_rename.values())) == len(set(rename.values())):
+            break
+        rename = new_rename
+    # Keep the start state's name, so that the start doesn't move
+    representative = rename[nfa.start]
+    for state, group in rename.items():
+        if group == representative:
+            rename[state] = nfa.start
+
+    new_edges: Edges = defaultdict(set)
+    for (source, char), targets in edges.items():
+        new_edges[(rename[source], char)] |= {rename[target] for target in targets}
+    finals = {rename[state] for state in nfa.final_set if state in rename}
+    kept = [state for state in states if rename[state] == state]
+    return _build(nfa, kept, dict(new_edges), finals)
+
+
+PASSES: list[Callable[[Nfa[Any]], Nfa[Any]]] = [
+    remove_epsilons,
+    prune,
+    merge_equivalent,
+]
+
+
+@stats.stage("simplify")
+def simplify[T](
+    nfa: Nfa[T],
+    passes: Sequence[Callable[[Nfa[T]], Nfa[T]]] = PASSES,
+    report: Callable[[PassReport], None] | None = None,
+) -> Nfa[T]:
+    """
+    Run the passes in order. The result has no ε-edges (with the
+    default passes) and accepts the same language, so it can be used
+    anywhere the original NFA is. `report`, if given, is called with
+    the size of the NFA before and after each pass.
+    """
+    for simplification in passes:
+        before = _size(nfa) if report is not None else (0, 0)
+        nfa = simplification(nfa)
+        if report is not None:
+            report(PassReport(simplification.__name__, *before, *_size(nfa)))
+    return nfa
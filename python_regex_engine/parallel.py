@@ -0,0 +1,145 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from types import TracebackType
+from typing import Iterable, Iterator, Self
+
+from python_regex_engine import serialize
+from python_regex_engine.compiled import CompiledDfa
+from python_regex_engine.monoids import Transition
+
+CHUNK_SIZE = 1 << 20
+
+_worker_matcher: CompiledDfa | None = None
+
+
+def chunk_transition(matcher: CompiledDfa, chunk: str) -> Transition:
+    """
+    Run every state of the matcher through the chunk at once. Runs
+    that reach the same state are merged, and runs in a state that
+    every character of the alphabet leaves unchanged stop moving, so
+    once at most one run is left moving this costs about as much as a
+    single run.
+    """
+    chunk = matcher.normalize(chunk)
+    table, n_classes = matcher.table, matcher.n_classes
+    lookup, other = matcher.class_of.get, matcher.other_class
+    absorbing = _absorbing_states(matcher)
+    # group_of[q] is the run started from q; current[g] is where run g is
+    group_of = list(range(len(matcher)))
+    current = list(range(len(matcher)))
+    for i, char in enumerate(chunk):
+        char_class = lookup(char, other)
+        current = [table[state * n_classes + char_class] for state in current]
+        if len(set(current)) < len(current):
+            merged: dict[int, int] = {}
+            renumber = [merged.setdefault(state, len(merged)) for state in current]
+            group_of = [renumber[group] for group in group_of]
+            current = list(merged)
+            moving = [
+                g for g, state in enumerate(current) if not absorbing >> state & 1
+            ]
+            if len(moving) <= 1:
+                rest = chunk[i + 1 :]
+                if set(rest).issubset(matcher.class_of):
+                    for group in moving:
+                        current[group] = matcher.delta_star(current[group], rest)
+                else:
+                    # A character outside the alphabet takes every
+                    # state to the same one, so all runs end together
+                    current = [matcher.delta_star(current[0], rest)] * len(current)
+                break
+    return Transition(tuple([current[group] for group in group_of]))
+
+
+def _absorbing_states(matcher: CompiledDfa) -> int:
+    """Bit q is set iff every character of the alphabet leads from q to q"""
+    result = 0
+    for state in range(len(matcher)):
+        start = state * matcher.n_classes
+        row = matcher.table[start : start + matcher.other_class]
+        if all(target == state for target in row):
+            result |= 1 << state
+    return result
+
+
+def _init_worker(data: bytes) -> None:
+    global _worker_matcher
+    _worker_matcher = serialize.loads(data)
+
+
+def _worker_transition(chunk: str) -> Transition:
+    assert _worker_matcher is not None
+    return chunk_transition(_worker_matcher, chunk)
+
+
+def split(input: str, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    for i in range(0, len(input), chunk_size):
+        yield input[i : i + chunk_size]
+
+
+class ParallelMatcher:
+    def __init__(
+        self,
+        matcher: CompiledDfa,
+        max_workers: int | None = None,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        """
+        Match large inputs on several cores. The input is split into
+        chunks, worker processes compute the Transition of each chunk,
+        and the Transitions are added up in order; applying the sum to
+        the start state gives the state after the whole input.
+
+        The matcher is sent to each worker once, in the binary format
+        of the serialize module. At most twice as many chunks as
+        there are workers are in flight, so chunks can come from a
+        stream that doesn't fit in memory.
+        """
+        if max_workers is None:
+            max_workers = os.process_cpu_count() or 1
+        self.matcher = matcher
+        self.chunk_size = chunk_size
+        self.max_in_flight = 2 * max_workers
+        self.executor = ProcessPoolExecutor(
+            max_workers,
+            initializer=_init_worker,
+            initargs=(serialize.dumps(matcher),),
+        )
+
+    def transition(self, chunks: Iterable[str]) -> Transition:
+        result = Transition()
+        in_flight: deque[Future[Transition]] = deque()
+        for chunk in chunks:
+            in_flight.append(self.executor.submit(_worker_transition, chunk))
+            if len(in_flight) >= self.max_in_flight:
+                result += in_flight.popleft().result()
+        while in_flight:
+            result += in_flight.popleft().result()
+        return result
+
+    def delta_star(self, state: int, input: str | Iterable[str]) -> int:
+        if isinstance(input, str):
+            if len(input) <= self.chunk_size:
+                return self.matcher.delta_star(state, input)
+            input = split(input, self.chunk_size)
+        result: int = self.transition(input)(state)
+        return result
+
+    def accepts(self, input: str | Iterable[str]) -> bool:
+        """`input` is either a string or its chunks, in order"""
+        return self.matcher.is_final(self.delta_star(self.matcher.start, input))
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
@@ -1,28 +1,19 @@
-from typing import Callable
+import re
+import string
+import sys
+from array import array
+from functools import cache
+from typing import Protocol
 
 from lark import Lark, Token, Transformer, Tree
 
+from python_regex_engine import stats
 from python_regex_engine.automata import ALPHABET, Nfa
-from python_regex_engine.monoids import Set, Sum
+from python_regex_engine.charclass import UNICODE, CharSet
+from python_regex_engine.monoids import Sum
+from python_regex_engine.thompson import Fragment, NfaBuilder
 
-state_index = 1
-
-
-def fresh_state_closure() -> Callable[[], Sum]:
-    state_index = Sum(0)
-
-    def increment() -> Sum:
-        nonlocal state_index
-        state_index += 1
-        return state_index
-
-    return increment
-
-
-fresh_state = fresh_state_closure()
-
-regex_lexer = Lark(
-    r"""
+GRAMMAR = r"""
     regex: primitive
          | exp
          // | "[" range "]"
@@ -52,98 +43,364 @@ regex_lexer = Lark(
     %import common.ESCAPED_STRING -> STRING
     %import common.WS
     %ignore WS
-""",
-    start="regex",
-)
+"""
+
 
+@cache
+def _regex_lexer() -> Lark:
+    return Lark(GRAMMAR, start="regex")
 
-def nodes_to_nfas(*items: Tree[Nfa[Sum]]) -> list[Nfa[Sum]]:
-    children: list[Nfa[Sum] | Tree[Nfa[Sum]]] = [t.children[0] for t in items]
-    nfas: list[Nfa[Sum]] = []
+
+def __getattr__(name: str) -> Lark:
+    """
+    The Earley parser for GRAMMAR is only compiled the first time
+    `regex_lexer` is used, so importing this module stays cheap.
+    """
+    if name == "regex_lexer":
+        return _regex_lexer()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def nodes_to_fragments(*items: Tree[Fragment]) -> list[Fragment]:
+    children: list[Fragment | Tree[Fragment]] = [t.children[0] for t in items]
+    fragments: list[Fragment] = []
     for mayb_tree in children:
         while isinstance(mayb_tree, Tree):
             assert len(mayb_tree.children) == 1
             mayb_tree = mayb_tree.children[0]
-        nfas.append(mayb_tree)
-    return nfas
+        fragments.append(mayb_tree)
+    return fragments
 
 
 class RegexParser(Transformer):
-    def regex_kleene(self, items: list[Tree[Nfa[Sum]]]) -> Nfa[Sum]:
+    def __init__(self, alphabet: str | CharSet = ALPHABET) -> None:
+        """
+        Syntax directed translation of the parse tree to an ε-NFA.
+
+        The rules only add states and edges to an NfaBuilder and pass
+        Fragments up the tree; `transform` builds the Nfa once the
+        whole tree has been visited.
+        """
+        super().__init__()
+        self.alphabet = alphabet
+
+    @stats.stage("parse")
+    def transform(self, tree: Tree[Token]) -> Nfa[Sum]:
+        self.builder = NfaBuilder(self.alphabet)
+        result_mayb_tree = super().transform(tree)
+        while isinstance(result_mayb_tree, Tree):
+            result_mayb_tree = result_mayb_tree.children[0]
+        fragment: Fragment = result_mayb_tree
+        return self.builder.build(fragment)
+
+    def regex_kleene(self, items: list[Tree[Fragment]]) -> Fragment:
         assert len(items) == 1
-        sub_nfa = nodes_to_nfas(*items)[0]
-        assert len(sub_nfa.final_set) == 1
-
-        sub_nfa_end = sub_nfa.final_set.pop()
-        new_start = fresh_state()
-        new_end = fresh_state()
-
-        trans_fn = sub_nfa.trans_fn.copy()
-        trans_fn.update({(new_start, ""): Set([new_end, sub_nfa.start])})
-        trans_fn.update({(sub_nfa_end, ""): Set([sub_nfa.start, new_end])})
-        result: Nfa[Sum] = Nfa(
-            new_start,
-            sub_nfa.state_set.union(Set({new_start, new_end})),
-            sub_nfa.alphabet,
-            trans_fn,
-            Set({new_end}),
-        )
-        return result
+        return self.builder.star(*nodes_to_fragments(*items))
 
-    def regex_concat(self, items: list[Tree[Nfa[Sum]]]) -> Nfa[Sum]:
+    def regex_concat(self, items: list[Tree[Fragment]]) -> Fragment:
         assert len(items) == 2
-        left, right = nodes_to_nfas(*items)
-        assert len(left.final_set) == 1
-        assert len(right.final_set) == 1
-
-        new_start = fresh_state()
-        new_end = fresh_state()
-
-        trans_fn = left.trans_fn.copy()
-        trans_fn.update(right.trans_fn)
-        trans_fn.update({(new_start, ""): Set([left.start])})
-        trans_fn.update({(left.final_set.pop(), ""): Set([right.start])})
-        trans_fn.update({(right.final_set.pop(), ""): Set([new_end])})
-        result: Nfa[Sum] = Nfa(
-            new_start,
-            right.state_set.union(left.state_set).union(Set({new_start, new_end})),
-            left.alphabet,
-            trans_fn,
-            Set([new_end]),
-        )
-        return result
+        return self.builder.concat(*nodes_to_fragments(*items))
 
-    def regex_or(self, items: list[Tree[Nfa[Sum]]]) -> Nfa[Sum]:
+    def regex_or(self, items: list[Tree[Fragment]]) -> Fragment:
         assert len(items) == 2
-        left, right = nodes_to_nfas(*items)
-        assert len(left.final_set) == 1
-        assert len(right.final_set) == 1
-
-        new_start = fresh_state()
-        new_end = fresh_state()
-        new_state_set = right.state_set.union(left.state_set).union(
-            Set({new_start, new_end})
-        )
-
-        trans_fn = left.trans_fn.copy()
-        trans_fn.update(right.trans_fn)
-        trans_fn.update({(new_start, ""): Set([right.start, left.start])})
-        trans_fn.update({(right.final_set.pop(), ""): Set([new_end])})
-        trans_fn.update({(left.final_set.pop(), ""): Set([new_end])})
-        result: Nfa[Sum] = Nfa(
-            new_start,
-            new_state_set,
-            left.alphabet,
-            trans_fn,
-            Set([new_end]),
-        )
+        return self.builder.union(*nodes_to_fragments(*items))
+
+    def primitive(self, items: list[Token]) -> Fragment:
+        return self.builder.symbol(items[0][0])
+
+
+class RegexSyntaxError(ValueError):
+    def __init__(self, message: str, pattern: str, pos: int):
+        super().__init__("{} at position {} in {!r}".format(message, pos, pattern))
+        self.pattern = pattern
+        self.pos = pos
+
+
+class Builder[F](Protocol):
+    """The operations a regex is translated to, e.g. NfaBuilder"""
+
+    def symbol(self, char: str) -> F: ...
+
+    def charset(self, chars: CharSet) -> F: ...
+
+    def empty(self) -> F: ...
+
+    def concat(self, left: F, right: F) -> F: ...
+
+    def union(self, left: F, right: F) -> F: ...
+
+    def star(self, inner: F) -> F: ...
+
+    def plus(self, inner: F) -> F: ...
+
+
+# Characters with a special meaning; any other character that isn't
+# whitespace stands for itself
+METACHARS = frozenset("|*+?()[]{}.\\")
+CLASS_ESCAPES = frozenset("dDwWsS")
+CHAR_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "f": "\f", "v": "\v", "0": "\0"}
+
+
+@cache
+def _every_char() -> str:
+    """All of the code points, in order"""
+    codes = array("I", range(sys.maxunicode + 1))
+    return codes.tobytes().decode("utf-32-le", "surrogatepass")
+
+
+@cache
+def _class_escape(char: str) -> CharSet:
+    """
+    The class of \\d, \\w or \\s, or of their negations in upper
+    case. They mean what they mean in Python's re, Unicode included,
+    so the class is found by running re over every code point, once.
+    """
+    matches = re.finditer("\\" + char.lower() + "+", _every_char())
+    chars = CharSet((match.start(), match.end() - 1) for match in matches)
+    return UNICODE - chars if char.isupper() else chars
+
+
+class _Reader[F]:
+    def __init__(self, pattern: str, builder: Builder[F]):
+        """
+        A recursive descent parser with the usual precedence (postfix
+        operators bind tighter than concatenation, which binds tighter
+        than |) and left associativity:
+
+            regex  := concat ("|" concat)*
+            concat := repeat repeat*
+            repeat := atom ("*" | "+" | "?" | "{" m "}" | "{" m ",}"
+                            | "{" m "," n "}")*
+            atom   := char | "\\" escape | "." | "[" "^"? item+ "]"
+                    | "(" regex ")"
+            item   := char ("-" char)? | "\\" escape
+
+        A class (or ".", or an escape like \\d) becomes one transition
+        labelled with a CharSet. Outside of classes, whitespace is
+        skipped; match it with an escape or a class.
+
+        `?` is a union with the empty string and `+` is a Builder
+        operation of its own, so neither copies the atom. `{m,n}` is
+        rewritten in terms of the Builder operations, re-reading the
+        repeated atom for every copy of it that is needed: x{2,} is
+        xxx* and x{1,3} is x(x(x)?)?, so the size of the result is
+        linear in n.
+
+        Each level of parentheses takes a few Python frames; a pattern
+        nested deeper than the recursion limit allows is rejected with
+        a RegexSyntaxError.
+        """
+        self.pattern = pattern
+        self.builder = builder
+        self.pos = 0
+
+    def error(self, message: str) -> RegexSyntaxError:
+        return RegexSyntaxError(message, self.pattern, self.pos)
+
+    def peek(self) -> str:
+        while self.pos < len(self.pattern) and self.pattern[self.pos].isspace():
+            self.pos += 1
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else ""
+
+    def parse(self) -> F:
+        try:
+            result = self.regex()
+        except RecursionError:
+            raise self.error("Nesting too deep") from None
+        if self.peek() != "":
+            raise self.error("Unexpected {!r}".format(self.peek()))
+        return result
+
+    def regex(self) -> F:
+        result = self.concat()
+        while self.peek() == "|":
+            self.pos += 1
+            result = self.builder.union(result, self.concat())
         return result
 
-    def primitive(self, items: list[Token]) -> Nfa[Sum]:
-        # 1 -a-> 2
-        start = fresh_state()
-        end = fresh_state()
-        char = items[0][0]
-        trans_fn: dict[tuple[Sum, str], Set[Sum]] = {(start, char): Set({end})}
-        result: Nfa[Sum] = Nfa(start, Set({start, end}), ALPHABET, trans_fn, Set({end}))
+    def concat(self) -> F:
+        result = self.repeat()
+        while self.peek() not in ("", "|", ")"):
+            result = self.builder.concat(result, self.repeat())
         return result
+
+    def repeat(self) -> F:
+        self.peek()
+        start = self.pos
+        result = self.atom()
+        while True:
+            char = self.peek()
+            end = self.pos
+            if char == "*":
+                self.pos += 1
+                result = self.builder.star(result)
+            elif char == "+":
+                self.pos += 1
+                result = self.builder.plus(result)
+            elif char == "?":
+                self.pos += 1
+                result = self.builder.union(result, self.builder.empty())
+            elif char == "{":
+                low, high = self.bounds()
+                result = self.counted(result, start, end, low, high)
+            else:
+                return result
+
+    def copy(self, start: int, end: int) -> F:
+        """Translate pattern[start:end] again, for another copy of it"""
+        reader = _Reader(self.pattern[start:end], self.builder)
+        return reader.repeat()
+
+    def bounds(self) -> tuple[int, int | None]:
+        self.pos += 1
+        low = self.number()
+        high: int | None = low
+        if self.peek() == ",":
+            self.pos += 1
+            high = None if self.peek() == "}" else self.number()
+        if self.peek() != "}":
+            raise self.error("Expected '}'")
+        if high is not None and high < low:
+            raise self.error("Bad repetition {{{},{}}}".format(low, high))
+        self.pos += 1
+        return low, high
+
+    def number(self) -> int:
+        self.peek()
+        start = self.pos
+        while self.pos < len(self.pattern) and self.pattern[self.pos].isdigit():
+            self.pos += 1
+        if self.pos == start:
+            raise self.error("Expected a number")
+        return int(self.pattern[start : self.pos])
+
+    def counted(self, first: F, start: int, end: int, low: int, high: int | None) -> F:
+        """
+        `first` followed by more copies of pattern[start:end], so
+        that it is repeated between low and high (or more) times
+        """
+        unused = [first]
+
+        def take() -> F:
+            return unused.pop() if unused else self.copy(start, end)
+
+        result: F | None = None
+        for _ in range(low):
+            piece = take()
+            result = piece if result is None else self.builder.concat(result, piece)
+        tail: F | None = None
+        if high is None:
+            tail = self.builder.star(take())
+        else:
+            for _ in range(high - low):
+                piece = take()
+                if tail is not None:
+                    piece = self.builder.concat(piece, tail)
+                tail = self.builder.union(piece, self.builder.empty())
+        if tail is None:
+            return self.builder.empty() if result is None else result
+        return tail if result is None else self.builder.concat(result, tail)
+
+    def atom(self) -> F:
+        char = self.peek()
+        if char == "(":
+            self.pos += 1
+            result = self.regex()
+            if self.peek() != ")":
+                raise self.error("Expected ')'")
+            self.pos += 1
+            return result
+        if char == "":
+            raise self.error("Unexpected end of pattern")
+        if char == "[":
+            return self.builder.charset(self.char_class())
+        self.pos += 1
+        if char == ".":
+            return self.builder.charset(UNICODE)
+        if char == "\\":
+            escaped = self.escape()
+            if isinstance(escaped, CharSet):
+                return self.builder.charset(escaped)
+            return self.builder.symbol(escaped)
+        if char in METACHARS:
+            self.pos -= 1
+            raise self.error("Unexpected {!r}".format(char))
+        return self.builder.symbol(char)
+
+    def escape(self) -> str | CharSet:
+        """The character or class after a backslash"""
+        if self.pos >= len(self.pattern):
+            raise self.error("Unexpected end of pattern")
+        char = self.pattern[self.pos]
+        self.pos += 1
+        if char in CLASS_ESCAPES:
+            return _class_escape(char)
+        if char in CHAR_ESCAPES:
+            return CHAR_ESCAPES[char]
+        if char in "xu":
+            digits = self.pattern[self.pos : self.pos + (2 if char == "x" else 4)]
+            if len(digits) != (2 if char == "x" else 4) or not all(
+                digit in string.hexdigits for digit in digits
+            ):
+                raise self.error("Bad \\{} escape".format(char))
+            self.pos += len(digits)
+            return chr(int(digits, 16))
+        if char.isalnum():
+            self.pos -= 1
+            raise self.error("Unknown escape \\{}".format(char))
+        return char
+
+    def char_class(self) -> CharSet:
+        """A bracketed class, e.g. [a-z_] or [^0-9]"""
+        self.pos += 1
+        negate = self.pattern.startswith("^", self.pos)
+        if negate:
+            self.pos += 1
+        result = CharSet()
+        first = True
+        while True:
+            if self.pos >= len(self.pattern):
+                raise self.error("Expected ']'")
+            char = self.pattern[self.pos]
+            if char == "]" and not first:
+                self.pos += 1
+                break
+            first = False
+            item = self.class_char()
+            if isinstance(item, CharSet):
+                result |= item
+            elif self.pattern.startswith("-", self.pos) and not self.pattern.startswith(
+                "-]", self.pos
+            ):
+                self.pos += 1
+                last = self.class_char()
+                if isinstance(last, CharSet) or last < item:
+                    raise self.error("Bad range")
+                result |= CharSet.range(item, last)
+            else:
+                result |= CharSet.of(item)
+        return UNICODE - result if negate else result
+
+    def class_char(self) -> str | CharSet:
+        if self.pos >= len(self.pattern):
+            raise self.error("Expected ']'")
+        char = self.pattern[self.pos]
+        self.pos += 1
+        if char == "\\":
+            return self.escape()
+        if char in "[]":
+            self.pos -= 1
+            raise self.error("Unexpected {!r} in class".format(char))
+        return char
+
+
+@stats.stage("parse")
+def parse[F](pattern: str, builder: Builder[F]) -> F:
+    """Parse a regular expression, translating it with `builder`"""
+    return _Reader(pattern, builder).parse()
+
+
+def regex_to_nfa(text: str, alphabet: str | CharSet = ALPHABET) -> Nfa[Sum]:
+    """Parse a regular expression and translate it to an ε-NFA"""
+    builder = NfaBuilder(alphabet)
+    return builder.build(parse(text, builder))
@@ -0,0 +1,177 @@
+from bisect import bisect_right
+from typing import Any, Callable, Hashable
+
+from python_regex_engine import stats
+from python_regex_engine.automata import Dfa
+from python_regex_engine.charclass import ClassAlphabet
+from python_regex_engine.compiled import CompiledDfa
+from python_regex_engine.lazy import LazyDfa
+from python_regex_engine.monoids import Set
+
+# How each operator combines acceptance, and when a pair is dead given
+# whether each side is
+OPERATORS: dict[
+    str, tuple[Callable[[bool, bool], bool], Callable[[bool, bool], bool]]
+] = {
+    "&": (lambda left, right: left and right, lambda left, right: left or right),
+    "-": (lambda left, right: left and not right, lambda left, right: left),
+    "^": (lambda left, right: left != right, lambda left, right: left and right),
+}
+
+
+class Product:
+    start: int
+
+    def __init__(
+        self,
+        operator: str,
+        left: "CompiledDfa | LazyDfa[Any] | Product",
+        right: "CompiledDfa | LazyDfa[Any] | Product",
+    ):
+        """
+        The product of two DFAs, for the intersection (&), difference
+        (-) or symmetric difference (^) of their languages.
+
+        States are pairs of states of the operands, but a pair is only
+        created, and given the next integer as its name, the first time
+        the input reaches it; its transitions are likewise cached one
+        character at a time. So matching never builds more of the
+        |Q1|×|Q2| product than the input visits. The operands read the
+        characters themselves, so each may have its own alphabet, and
+        may be LazyDfas (the matchers of patterns over budget).
+
+        `materialize` builds the whole (reachable) product instead and
+        minimizes it, for patterns that are matched often.
+        """
+        if operator not in OPERATORS:
+            raise ValueError("Unknown operator: {}".format(operator))
+        self.operator = operator
+        self.left = left
+        self.right = right
+        self._accepts, self._dead = OPERATORS[operator]
+        self.pairs: list[tuple[int, int]] = []
+        self._names: dict[tuple[int, int], int] = {}
+        self._transitions: list[dict[str, int]] = []
+        self.accepting = 0
+        self.dead = 0
+        self.start = self._name((left.start, right.start))
+
+    def _name(self, pair: tuple[int, int]) -> int:
+        try:
+            return self._names[pair]
+        except KeyError:
+            pass
+        name = self._names[pair] = len(self.pairs)
+        self.pairs.append(pair)
+        self._transitions.append({})
+        left, right = pair
+        if self._accepts(self.left.is_final(left), self.right.is_final(right)):
+            self.accepting |= 1 << name
+        # Only what the operands know on their own: A - B is dead
+        # once B accepts everything, but that isn't detected
+        if self._dead(self.left.is_dead(left), self.right.is_dead(right)):
+            self.dead |= 1 << name
+        return name
+
+    def delta(self, state: int, char: str) -> int:
+        transitions = self._transitions[state]
+        try:
+            return transitions[char]
+        except KeyError:
+            pass
+        left, right = self.pairs[state]
+        target = transitions[char] = self._name(
+            (self.left.delta(left, char), self.right.delta(right, char))
+        )
+        return target
+
+    def delta_star(self, state: int, input: str) -> int:
+        if stats.active is not None:
+            stats.active.count("transitions", len(input))
+        transitions = self._transitions
+        for char in input:
+            try:
+                state = transitions[state][char]
+            except KeyError:
+                state = self.delta(state, char)
+            if self.dead >> state & 1:
+                break
+        return state
+
+    def is_final(self, state: int) -> bool:
+        return bool(self.accepting >> state & 1)
+
+    def is_dead(self, state: int) -> bool:
+        return bool(self.dead >> state & 1)
+
+    def accepts(self, input: str) -> bool:
+        return self.is_final(self.delta_star(self.start, input))
+
+    def __len__(self) -> int:
+        """The number of pairs built so far"""
+        return len(self.pairs)
+
+    def segments(self) -> list[tuple[int, Hashable]]:
+        """See CompiledDfa.segments; the classes are pairs of classes"""
+        left = self.left.segments()
+        right = self.right.segments()
+        left_starts = [start for start, _ in left]
+        right_starts = [start for start, _ in right]
+        return [
+            (
+                start,
+                (
+                    left[bisect_right(left_starts, start) - 1][1],
+                    right[bisect_right(right_starts, start) - 1][1],
+                ),
+            )
+            for start in sorted(set(left_starts) | set(right_starts))
+        ]
+
+    def class_alphabet(self) -> ClassAlphabet:
+        """The classes of characters that neither operand tells apart"""
+        segments = self.segments()
+        class_ids: dict[Hashable, int] = {}
+        classes = [class_ids.setdefault(key, len(class_ids)) for _, key in segments]
+        return ClassAlphabet([start for start, _ in segments], classes)
+
+    @stats.stage("product")
+    def to_dfa(self) -> Dfa[int]:
+        """Every pair reachable from the start, as a DFA"""
+        alphabet = self.class_alphabet()
+        trans_fn: dict[tuple[int, str], int] = {}
+        stack = [self.start]
+        seen = {self.start}
+        while stack:
+            state = stack.pop()
+            for char in alphabet:
+                target = trans_fn[(state, char)] = self.delta(state, char)
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        finals = [state for state in seen if self.is_final(state)]
+        result: Dfa[int] = Dfa(
+            self.start, Set(list(seen)), alphabet, trans_fn, Set(finals)
+        )
+        return result
+
+    def materialize(self) -> CompiledDfa:
+        """The minimal DFA of the product, compiled"""
+        return CompiledDfa.from_dfa(self.to_dfa().minimize().reindex())
+
+    def _combine(self, operator: str, other: object) -> "Product":
+        if not isinstance(other, (Product, CompiledDfa, LazyDfa)):
+            return NotImplemented
+        return Product(operator, self, other)
+
+    def __and__(self, other: "Product | CompiledDfa | LazyDfa[Any]") -> "Product":
+        return self._combine("&", other)
+
+    def __sub__(self, other: "Product | CompiledDfa | LazyDfa[Any]") -> "Product":
+        return self._combine("-", other)
+
+    def __xor__(self, other: "Product | CompiledDfa | LazyDfa[Any]") -> "Product":
+        return self._combine("^", other)
+
+    def __repr__(self) -> str:
+        return "Product({!r}, {!r}, {!r})".format(self.operator, self.left, self.right)
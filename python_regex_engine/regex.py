@@ -0,0 +1,304 @@
+import hashlib
+import os
+from functools import cached_property, lru_cache
+from typing import TYPE_CHECKING, Iterator, NamedTuple, Sequence
+
+from python_regex_engine import derivatives, serialize
+from python_regex_engine.automata import ALPHABET, Budget, Dfa, Nfa, StateLimitExceeded
+from python_regex_engine.charclass import CharSet
+from python_regex_engine.compiled import CompiledDfa
+from python_regex_engine.lazy import LazyDfa
+from python_regex_engine.monoids import Sum
+from python_regex_engine.optimize import simplify
+from python_regex_engine.parser import parse, regex_to_nfa
+from python_regex_engine.product import Product
+from python_regex_engine.search import Match, Scanner
+from python_regex_engine.stream import StreamMatcher, accepts_stream
+from python_regex_engine.thompson import NfaBuilder
+
+if TYPE_CHECKING:
+    import asyncio
+
+    import numpy as np
+
+CACHE_SIZE = 512
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int | None
+    currsize: int
+
+
+class Pattern:
+    def __init__(
+        self,
+        pattern: str,
+        alphabet: str | CharSet = ALPHABET,
+        matcher: CompiledDfa | None = None,
+        construction: str = "thompson",
+        budget: Budget | None = None,
+        fallback: bool = False,
+    ):
+        """
+        A regular expression run through the whole pipeline once:
+            regex -> ε-NFA -> NFA -> DFA -> minimal DFA -> CompiledDfa
+        The intermediate automata are available for inspection, but
+        matching only touches the compiled one. When the matcher is
+        given (e.g. loaded from disk) they are only built if asked for.
+
+        The DFA is built by one of two constructions:
+            * "thompson": the pipeline above
+            * "derivatives": Brzozowski derivatives of the regex (see
+              the derivatives module), which skips the NFA and often
+              compiles much faster
+        Both give the same minimal DFA.
+
+        The alphabet is a string of characters, or a CharSet such as
+        charclass.UNICODE or charclass.BYTES (match bytes by decoding
+        them as latin-1), whose characters are split into the classes
+        the pattern can tell apart.
+
+        With a budget, building a DFA with more states or memory than
+        it allows raises StateLimitExceeded. With `fallback` as well,
+        the pattern is matched by a LazyDfa of its NFA instead, and
+        `limit_exceeded` keeps the error. Searching still needs DFAs,
+        so it raises if they go over the budget.
+        """
+        self.pattern = pattern
+        self.alphabet = alphabet
+        if construction not in ("thompson", "derivatives"):
+            raise ValueError("Unknown construction: {}".format(construction))
+        self.construction = construction
+        self.budget = budget
+        self.limit_exceeded: StateLimitExceeded | None = None
+        self.matcher: CompiledDfa | LazyDfa[Sum]
+        if matcher is not None:
+            self.matcher = matcher
+            return
+        try:
+            self.matcher = CompiledDfa.from_dfa(self.dfa)
+        except StateLimitExceeded as error:
+            if not fallback:
+                raise
+            self.limit_exceeded = error
+            self.matcher = LazyDfa(simplify(self.nfa))
+
+    @cached_property
+    def nfa(self) -> Nfa[Sum]:
+        return regex_to_nfa(self.pattern, self.alphabet)
+
+    @cached_property
+    def dfa(self) -> Dfa[int]:
+        if self.construction == "derivatives":
+            dfa = derivatives.regex_to_dfa(self.pattern, self.alphabet, self.budget)
+            return dfa.minimize().reindex()
+        return self.nfa.to_dfa(self.budget).minimize().reindex()
+
+    @cached_property
+    def scanner(self) -> Scanner:
+        """The extra automata for searching, built on first use"""
+        anchored = self.matcher if isinstance(self.matcher, CompiledDfa) else None
+        return Scanner(self.pattern, self.alphabet, anchored, self.budget)
+
+    def accepts(self, input: str) -> bool:
+        return self.matcher.accepts(input)
+
+    def accepts_many(self, strings: Sequence[str]) -> "np.ndarray | list[bool]":
+        """See CompiledDfa.accepts_many"""
+        return self.matcher.accepts_many(strings)
+
+    def stream(self) -> StreamMatcher:
+        """A matcher to feed the input to in chunks"""
+        return StreamMatcher(self.matcher)
+
+    async def accepts_stream(
+        self, reader: "asyncio.StreamReader", encoding: str = "utf-8"
+    ) -> bool:
+        """See stream.accepts_stream"""
+        return await accepts_stream(self.matcher, reader, encoding)
+
+    def fullmatch(self, string: str) -> Match | None:
+        return Match(0, len(string), string) if self.accepts(string) else None
+
+    def match(self, string: str, pos: int = 0) -> Match | None:
+        """The longest match starting at pos"""
+        return self.scanner.match(string, pos)
+
+    def search(self, string: str, pos: int = 0) -> Match | None:
+        """The leftmost-longest match starting at or after pos"""
+        return self.scanner.search(string, pos)
+
+    def finditer(self, string: str, pos: int = 0) -> Iterator[Match]:
+        """All non-overlapping leftmost-longest matches, left to right"""
+        return self.scanner.finditer(string, pos)
+
+    def _combine(self, operator: str, left: object, right: object) -> Product:
+        operands = [
+            operand.matcher if isinstance(operand, Pattern) else operand
+            for operand in (left, right)
+        ]
+        if not all(
+            isinstance(operand, (Product, CompiledDfa, LazyDfa)) for operand in operands
+        ):
+            return NotImplemented
+        return Product(operator, *operands)  # type: ignore[arg-type]
+
+    def __and__(self, other: "Pattern | Product") -> Product:
+        """
+        Matches what both match. See product.Product: the product DFA
+        is built lazily, call `materialize` on it for a CompiledDfa.
+        """
+        return self._combine("&", self, other)
+
+    def __rand__(self, other: "Pattern | Product") -> Product:
+        return self._combine("&", other, self)
+
+    def __sub__(self, other: "Pattern | Product") -> Product:
+        """Matches what self matches but other doesn't"""
+        return self._combine("-", self, other)
+
+    def __rsub__(self, other: "Pattern | Product") -> Product:
+        return self._combine("-", other, self)
+
+    def __xor__(self, other: "Pattern | Product") -> Product:
+        """Matches what exactly one of the two matches"""
+        return self._combine("^", self, other)
+
+    def __rxor__(self, other: "Pattern | Product") -> Product:
+        return self._combine("^", other, self)
+
+    def __repr__(self) -> str:
+        return "Pattern({!r}, alphabet={!r})".format(self.pattern, self.alphabet)
+
+
+class RegexSet:
+    def __init__(self, patterns: Sequence[str], alphabet: str | CharSet = ALPHABET):
+        """
+        Match many patterns with a single DFA.
+
+        The Thompson NFAs of the patterns are joined under one start
+        state and determinized together. Each DFA state is labelled
+        with the indices of the patterns whose accepting NFA state it
+        contains, and the labels are kept apart when minimizing, so
+        one pass over the input finds every pattern that matches.
+        """
+        self.patterns = list(patterns)
+        self.alphabet = alphabet
+        builder = NfaBuilder(alphabet)
+        fragments = [parse(pattern, builder) for pattern in self.patterns]
+        self.nfa: Nfa[Sum] = builder.build_union(fragments)
+
+        dfa, bits, subsets = self.nfa.determinize()
+        ends = [bits.to_mask([fragment.end]) for fragment in fragments]
+        labels = {
+            state: frozenset(i for i, end in enumerate(ends) if subset & end)
+            for state, subset in enumerate(subsets)
+        }
+        minimal = dfa.minimize(labels=labels)
+        names = {state: i for i, state in enumerate(minimal.state_set)}
+        self.dfa: Dfa[int] = minimal.reindex(names)
+        self.labels: list[frozenset[int]] = [frozenset()] * len(names)
+        for state, i in names.items():
+            self.labels[i] = labels[state]
+        self.matcher = CompiledDfa.from_dfa(self.dfa)
+
+    def matches(self, input: str) -> frozenset[int]:
+        """The indices of the patterns that match all of input"""
+        state = self.matcher.delta_star(self.matcher.start, input)
+        # The matcher's sink state has no label
+        return self.labels[state] if state < len(self.labels) else frozenset()
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def __repr__(self) -> str:
+        return "RegexSet({!r}, alphabet={!r})".format(self.patterns, self.alphabet)
+
+
+def _cache_path(pattern: str, alphabet: str | CharSet, cache_dir: str) -> str:
+    key = "\0".join([str(serialize.VERSION), pattern, repr(alphabet)])
+    digest = hashlib.sha256(key.encode("utf-8", "surrogatepass")).hexdigest()
+    return os.path.join(cache_dir, digest + ".dfa")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _compile(
+    pattern: str,
+    alphabet: str | CharSet,
+    cache_dir: str | None,
+    construction: str,
+    budget: Budget | None,
+    fallback: bool,
+) -> Pattern:
+    def build(matcher: CompiledDfa | None = None) -> Pattern:
+        return Pattern(pattern, alphabet, matcher, construction, budget, fallback)
+
+    if cache_dir is None:
+        return build()
+    path = _cache_path(pattern, alphabet, cache_dir)
+    try:
+        return build(serialize.load_mmap(path))
+    except (OSError, ValueError):
+        # Missing, unreadable or stale: compile and (re)write it
+        pass
+    result = build()
+    if isinstance(result.matcher, CompiledDfa):
+        os.makedirs(cache_dir, exist_ok=True)
+        serialize.save(result.matcher, path)
+    return result
+
+
+def compile(
+    pattern: str,
+    alphabet: str | CharSet = ALPHABET,
+    cache_dir: str | None = None,
+    construction: str = "thompson",
+    budget: Budget | None = None,
+    fallback: bool = False,
+) -> Pattern:
+    """
+    Compile a regular expression, reusing the result of an earlier
+    call with the same arguments. The CACHE_SIZE most recently used
+    patterns are kept.
+
+    With `cache_dir`, compiled DFAs are also stored there, named by a
+    hash of the pattern and alphabet, and later processes memory map
+    them instead of compiling again. Both constructions (see Pattern)
+    give the same DFA, so they share the files.
+
+    See Pattern for the budget and fallback. Patterns that fell back
+    to a LazyDfa aren't stored.
+    """
+    return _compile(pattern, alphabet, cache_dir, construction, budget, fallback)
+
+
+def counterexample(
+    pattern_1: str, pattern_2: str, alphabet: str | CharSet = ALPHABET
+) -> str | None:
+    """
+    A string that exactly one of the patterns matches, or None if they
+    match the same strings. Their simplified NFAs are compared
+    directly (see Nfa.subset_counterexample), so patterns whose DFAs
+    would be huge can still be compared.
+    """
+    builder = NfaBuilder(alphabet)
+    fragments = [parse(pattern_1, builder), parse(pattern_2, builder)]
+    nfa_1, nfa_2 = map(simplify, builder.build_each(fragments))
+    return nfa_1.counterexample(nfa_2)
+
+
+def equivalent(
+    pattern_1: str, pattern_2: str, alphabet: str | CharSet = ALPHABET
+) -> bool:
+    """Do the patterns match the same strings? See counterexample"""
+    return counterexample(pattern_1, pattern_2, alphabet) is None
+
+
+def cache_info() -> CacheInfo:
+    return CacheInfo(*_compile.cache_info())
+
+
+def cache_clear() -> None:
+    _compile.cache_clear()
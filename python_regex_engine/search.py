@@ -0,0 +1,232 @@
+from typing import Iterator, NamedTuple
+
+from python_regex_engine import stats
+from python_regex_engine.automata import Budget
+from python_regex_engine.charclass import CharSet
+from python_regex_engine.compiled import CompiledDfa
+from python_regex_engine.parser import Builder, parse
+from python_regex_engine.thompson import Fragment, NfaBuilder
+
+
+class Match(NamedTuple):
+    """The span string[start:end] matched by a pattern"""
+
+    start: int
+    end: int
+    string: str
+
+    def span(self) -> tuple[int, int]:
+        return (self.start, self.end)
+
+    def group(self) -> str:
+        return self.string[self.start : self.end]
+
+    def __repr__(self) -> str:
+        return "Match(span={}, match={!r})".format(self.span(), self.group())
+
+
+def _read(n: int) -> None:
+    if stats.active is not None:
+        stats.active.count("transitions", n)
+
+
+class _Reversed[F]:
+    def __init__(self, builder: Builder[F]):
+        """Translate a regex R to its reverse by swapping concatenations"""
+        self.builder = builder
+
+    def symbol(self, char: str) -> F:
+        return self.builder.symbol(char)
+
+    def charset(self, chars: CharSet) -> F:
+        return self.builder.charset(chars)
+
+    def empty(self) -> F:
+        return self.builder.empty()
+
+    def concat(self, left: F, right: F) -> F:
+        return self.builder.concat(right, left)
+
+    def union(self, left: F, right: F) -> F:
+        return self.builder.union(left, right)
+
+    def star(self, inner: F) -> F:
+        return self.builder.star(inner)
+
+    def plus(self, inner: F) -> F:
+        return self.builder.plus(inner)
+
+
+def _scanning_dfa(
+    pattern: str,
+    alphabet: str | CharSet,
+    reverse: bool,
+    unanchored: bool,
+    budget: Budget | None = None,
+    suffixes: bool = False,
+) -> CompiledDfa:
+    builder = NfaBuilder(alphabet)
+    fragment = parse(pattern, _Reversed(builder) if reverse else builder)
+    if unanchored:
+        # Σ*R
+        any_symbol = builder.charset(
+            alphabet if isinstance(alphabet, CharSet) else CharSet.of(alphabet)
+        )
+        nfa = builder.build(builder.concat(builder.star(any_symbol), fragment))
+    elif suffixes:
+        # Starting from any state gives the suffixes of R (and more, if
+        # some state can't be reached, which only adds candidates)
+        nfa = builder.build_union(
+            [Fragment(state, fragment.end) for state in builder.states]
+        )
+    else:
+        nfa = builder.build(fragment)
+    dfa = nfa.to_dfa(budget).minimize()
+    return CompiledDfa.from_dfa(dfa, restart=unanchored)
+
+
+class Scanner:
+    def __init__(
+        self,
+        pattern: str,
+        alphabet: str | CharSet,
+        anchored: CompiledDfa | None = None,
+        budget: Budget | None = None,
+    ):
+        """
+        Finds leftmost-longest matches of a pattern R inside a text
+        with three minimal DFAs:
+            * forward, for Σ*R: accepting after text[:j] iff some
+              match ends at j,
+            * backward, for the suffixes of rev(R), run over the text
+              from an end j: accepting after text[i:j] iff it is a
+              prefix of a match, and dead once it isn't even part of
+              one,
+            * anchored, for R: run from a start to find the longest
+              match beginning there (built here unless given).
+
+        From pos, the forward DFA finds the earliest end j of a match.
+        The leftmost match starts at some i <= j and ends at or after
+        j, so text[i:j] is a prefix of it: the backward DFA, run back
+        from j, lists the few possible i, and the anchored DFA picks
+        the first one where a match starts, and its longest end. Each
+        step only reads the text around the current match.
+
+        The three DFAs split the alphabet into the same classes, so a
+        text is normalized once (see CompiledDfa.normalize) for all of
+        them. `first_end`, `prefix_starts` and `longest` expect
+        normalized text. The budget, if any, applies to each of the
+        DFAs.
+        """
+        self.forward = _scanning_dfa(pattern, alphabet, False, True, budget)
+        self.backward = _scanning_dfa(pattern, alphabet, True, False, budget, True)
+        if anchored is None:
+            anchored = _scanning_dfa(pattern, alphabet, False, False, budget)
+        self.anchored = anchored
+        self._anchored_states = len(anchored)
+
+    def first_end(self, text: str, pos: int = 0) -> int | None:
+        """The smallest j such that some match ends at j"""
+        dfa = self.forward
+        table, n_classes, accepting = dfa.table, dfa.n_classes, dfa.accepting
+        lookup, other = dfa.class_of.get, dfa.other_class
+        state = dfa.start
+        if accepting >> state & 1:
+            return pos
+        for i in range(pos, len(text)):
+            state = table[state * n_classes + lookup(text[i], other)]
+            if accepting >> state & 1:
+                _read(i + 1 - pos)
+                return i + 1
+        _read(len(text) - pos)
+        return None
+
+    def prefix_starts(self, text: str, end: int, pos: int = 0) -> list[int]:
+        """Each i in [pos, end], in order, with text[i:end] a prefix of a match"""
+        dfa = self.backward
+        table, n_classes, accepting = dfa.table, dfa.n_classes, dfa.accepting
+        lookup, other, dead = dfa.class_of.get, dfa.other_class, dfa.dead
+        state = dfa.start
+        result = [end] if accepting >> state & 1 else []
+        read = end - pos
+        for i in range(end - 1, pos - 1, -1):
+            state = table[state * n_classes + lookup(text[i], other)]
+            if dead >> state & 1:
+                read = end - i
+                break
+            if accepting >> state & 1:
+                result.append(i)
+        _read(read)
+        result.reverse()
+        return result
+
+    def longest(
+        self, text: str, start: int, memo: dict[int, int] | None = None
+    ) -> int | None:
+        """
+        The largest j such that text[start:j] is a match.
+
+        A memo can be shared by the calls on one text, from left to
+        right. It keeps the last end reachable from each (position,
+        state) the anchored DFA was in at or after the end found, where
+        the next search starts, so that those pairs aren't scanned
+        again: the runs from many starts cost no more than one pass.
+        """
+        dfa = self.anchored
+        table, n_classes, accepting = dfa.table, dfa.n_classes, dfa.accepting
+        lookup, other, dead = dfa.class_of.get, dfa.other_class, dfa.dead
+        if memo is None:
+            memo = {}
+        known = memo.get
+        n_states = self._anchored_states
+        length = len(text)
+        path = []
+        state = dfa.start
+        end = -1
+        i = start
+        while True:
+            key = i * n_states + state
+            found = known(key)
+            if found is not None:
+                end = found
+                break
+            path.append(key)
+            if dead >> state & 1 or i == length:
+                break
+            state = table[state * n_classes + lookup(text[i], other)]
+            i += 1
+        _read(i - start)
+        # Ends found later in the run are larger, so the first accepting
+        # state seen going back is the end for the rest of the path
+        for key in reversed(path):
+            position = key // n_states
+            if end == -1 and accepting >> key % n_states & 1:
+                end = position
+            if position < end:
+                break
+            memo[key] = end
+        return None if end == -1 else end
+
+    def _matches(self, text: str, normal: str, pos: int) -> Iterator[Match]:
+        memo: dict[int, int] = {}
+        while pos <= len(text):
+            first_end = self.first_end(normal, pos)
+            if first_end is None:
+                return
+            for start in self.prefix_starts(normal, first_end, pos):
+                end = self.longest(normal, start, memo)
+                if end is not None:
+                    break
+            assert end is not None
+            yield Match(start, end, text)
+            pos = end if end > start else end + 1
+
+    def finditer(self, text: str, pos: int = 0) -> Iterator[Match]:
+        return self._matches(text, self.forward.normalize(text), pos)
+
+    def search(self, text: str, pos: int = 0) -> Match | None:
+        return next(self.finditer(text, pos), None)
+
+    def match(self, text: str, pos: int = 0) -> Match | None:
+        end = self.longest(self.anchored.normalize(text), pos)
+        return None if end is None else Match(pos, end, text)
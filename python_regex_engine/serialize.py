@@ -0,0 +1,171 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import BinaryIO
+
+from python_regex_engine.charclass import ClassAlphabet
+from python_regex_engine.compiled import CompiledDfa
+
+MAGIC = b"RXDF"
+VERSION = 3
+
+# magic, version, reserved, start, n_classes, n_rows, n_chars, n_segments
+HEADER = struct.Struct("<4sHHIIIII")
+CLASS_ENTRY = struct.Struct("<II")
+SEGMENT_ENTRY = struct.Struct("<II")
+
+
+def dumps(matcher: CompiledDfa) -> bytes:
+    """
+    Serialize a CompiledDfa. All integers are little endian:
+        * the header (see HEADER),
+        * n_chars (code point, class) pairs of u32,
+        * n_segments (start, class) pairs of u32 (class 2^32 - 1
+          for no class), the segments of a ClassAlphabet,
+        * the n_rows × n_classes transition table as u32,
+        * the accepting states, one bit per row,
+        * the dead states (see CompiledDfa), one bit per row.
+    The sections before the table are a multiple of 4 bytes long, so
+    the table can be used in place from a memory map.
+    """
+    n_rows = len(matcher)
+    alphabet = matcher.alphabet
+    segments = [] if alphabet is None else zip(alphabet.starts, alphabet.classes)
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        0,
+        matcher.start,
+        matcher.n_classes,
+        n_rows,
+        len(matcher.class_of),
+        0 if alphabet is None else len(alphabet.starts),
+    )
+    class_map = b"".join(
+        CLASS_ENTRY.pack(ord(char), char_class)
+        for char, char_class in matcher.class_of.items()
+    )
+    segment_map = b"".join(
+        SEGMENT_ENTRY.pack(start, i & 0xFFFFFFFF) for start, i in segments
+    )
+    table = array("I", matcher.table)
+    if sys.byteorder != "little":
+        table.byteswap()
+    accepting = matcher.accepting.to_bytes((n_rows + 7) // 8, "little")
+    dead = matcher.dead.to_bytes((n_rows + 7) // 8, "little")
+    return header + class_map + segment_map + table.tobytes() + accepting + dead
+
+
+def loads(buffer: bytes | memoryview | mmap.mmap) -> CompiledDfa:
+    """
+    Read a CompiledDfa written by `dumps`. The transition table is a
+    view into `buffer` rather than a copy (except on big endian
+    machines, where it has to be byte swapped).
+
+    Raises ValueError if the buffer isn't a well formed compiled DFA,
+    so that a corrupt file can't make matching fail later. This reads
+    the whole table once, to check that every transition stays in it.
+    """
+    view = memoryview(buffer)
+    if len(view) < HEADER.size:
+        raise ValueError("Not a compiled DFA: too short")
+    magic, version, _, start, n_classes, n_rows, n_chars, n_segments = (
+        HEADER.unpack_from(view)
+    )
+    if magic != MAGIC:
+        raise ValueError("Not a compiled DFA: bad magic number {!r}".format(magic))
+    if version != VERSION:
+        raise ValueError("Unsupported compiled DFA version {}".format(version))
+
+    segments_offset = HEADER.size + n_chars * CLASS_ENTRY.size
+    table_offset = segments_offset + n_segments * SEGMENT_ENTRY.size
+    accepting_offset = table_offset + 4 * n_rows * n_classes
+    dead_offset = accepting_offset + (n_rows + 7) // 8
+    end = dead_offset + (n_rows + 7) // 8
+    if len(view) != end:
+        raise ValueError(
+            "Compiled DFA has {} bytes, expected {}".format(len(view), end)
+        )
+
+    if n_classes == 0 or start >= n_rows:
+        raise ValueError("Compiled DFA has no start state")
+
+    class_of = {
+        chr(code): char_class
+        for code, char_class in CLASS_ENTRY.iter_unpack(
+            view[HEADER.size : segments_offset]
+        )
+    }
+    if any(char_class >= n_classes for char_class in class_of.values()):
+        raise ValueError("Compiled DFA has a character class out of range")
+    segments = list(SEGMENT_ENTRY.iter_unpack(view[segments_offset:table_offset]))
+    _check_segments(segments)
+    alphabet = None
+    if segments:
+        alphabet = ClassAlphabet(
+            [start for start, _ in segments],
+            [-1 if i == 0xFFFFFFFF else i for _, i in segments],
+        )
+        # Inputs are normalized to the representatives, which are then
+        # looked up in class_of
+        if set(class_of) != set(alphabet):
+            raise ValueError("Compiled DFA has classes for the wrong characters")
+    table: memoryview | array[int] = view[table_offset:accepting_offset].cast("I")
+    if sys.byteorder != "little":
+        table = array("I", table)
+        table.byteswap()
+    if max(table, default=0) >= n_rows:
+        raise ValueError("Compiled DFA has a transition to a missing state")
+    accepting = int.from_bytes(view[accepting_offset:dead_offset], "little")
+    dead = int.from_bytes(view[dead_offset:end], "little")
+    return CompiledDfa(
+        start,
+        n_classes,
+        class_of,
+        table,
+        accepting,
+        alphabet,
+        dead,
+    )
+
+
+def _check_segments(segments: list[tuple[int, int]]) -> None:
+    """The segments must cut all code points, with classes numbered in order"""
+    n_classes = 0
+    previous = -1
+    for start, i in segments:
+        if start <= previous or (previous == -1 and start != 0):
+            raise ValueError("Compiled DFA has malformed segments")
+        if i != 0xFFFFFFFF:
+            if i > n_classes:
+                raise ValueError("Compiled DFA has a segment class out of range")
+            n_classes = max(n_classes, i + 1)
+        previous = start
+
+
+def dump(matcher: CompiledDfa, file: BinaryIO) -> None:
+    file.write(dumps(matcher))
+
+
+def load(file: BinaryIO) -> CompiledDfa:
+    return loads(file.read())
+
+
+def save(matcher: CompiledDfa, path: str | os.PathLike[str]) -> None:
+    """Write atomically, so concurrent readers never see half a file"""
+    tmp_path = "{}.{}.tmp".format(os.fspath(path), os.getpid())
+    with open(tmp_path, "wb") as file:
+        dump(matcher, file)
+    os.replace(tmp_path, path)
+
+
+def load_mmap(path: str | os.PathLike[str]) -> CompiledDfa:
+    """
+    Map the file into memory and match straight from it. The mapping
+    stays open as long as the returned matcher is alive.
+    """
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(buffer)
@@ -0,0 +1,96 @@
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Iterator, ParamSpec, TypeVar
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+# The Stats being collected into, if any. Instrumented code checks
+# this before doing anything else, so it costs one global lookup per
+# call while nothing is being collected.
+active: "Stats | None" = None
+# The stages currently being timed
+_running: set[str] = set()
+
+
+class Stats:
+    def __init__(self, hook: Callable[[str, float], None] | None = None):
+        """
+        Counters and per-stage timings of the pipeline:
+            * eps_close: calls to Nfa.eps_close
+            * eps_close_visited: states expanded by eps_close
+            * subset_states: DFA states created by Nfa.to_dfa
+            * derivative_states: DFA states created by derivatives.to_dfa
+            * minimize_rounds: Hopcroft splitters processed, or passes
+              over the table for the table method
+            * pairs_visited: state pairs searched by Dfa.counterexample,
+              and (state, macrostate) pairs by Nfa.subset_counterexample
+            * transitions: characters read by delta_star, and by the
+              DFAs of a search.Scanner
+        `hook`, if given, is called with the name and duration of each
+        stage as it finishes.
+        """
+        self.counters: Counter[str] = Counter()
+        self.seconds: dict[str, float] = defaultdict(float)
+        self.calls: Counter[str] = Counter()
+        self.hook = hook
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def __str__(self) -> str:
+        width = max(map(len, [*self.counters, *self.seconds]), default=0)
+        lines = [
+            "{:<{}}  {:>9.6f}s  ({} calls)".format(
+                name, width, self.seconds[name], self.calls[name]
+            )
+            for name in self.seconds
+        ]
+        lines += [
+            "{:<{}}  {:>10}".format(name, width, value)
+            for name, value in self.counters.items()
+        ]
+        return "\n".join(lines)
+
+
+@contextmanager
+def collect(hook: Callable[[str, float], None] | None = None) -> Iterator[Stats]:
+    """Collect stats about everything run inside the with block"""
+    global active
+    previous = active
+    active = stats = Stats(hook)
+    try:
+        yield stats
+    finally:
+        active = previous
+
+
+def stage(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """
+    Time each call of the decorated function as the stage `name`.
+    Calls of a stage from inside itself are only timed once.
+    """
+
+    def decorator(fn: Callable[P, R]) -> Callable[P, R]:
+        @wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            stats = active
+            if stats is None or name in _running:
+                return fn(*args, **kwargs)
+            _running.add(name)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _running.discard(name)
+                stats.seconds[name] += elapsed
+                stats.calls[name] += 1
+                if stats.hook is not None:
+                    stats.hook(name, elapsed)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,64 @@
+import codecs
+from typing import TYPE_CHECKING, Any
+
+from python_regex_engine.compiled import CompiledDfa
+from python_regex_engine.lazy import LazyDfa
+
+if TYPE_CHECKING:
+    import asyncio
+
+CHUNK_SIZE = 1 << 16
+
+
+class StreamMatcher:
+    state: int
+    dead: bool
+
+    def __init__(self, matcher: CompiledDfa | LazyDfa[Any]):
+        """
+        Match an input that arrives in pieces: `feed` each chunk in
+        order, then `finish` gives the verdict for their concatenation.
+        Only the current state is kept, so the input can be unbounded.
+
+        `dead` is set as soon as no continuation of the input can
+        match; the rest of the input can be skipped then.
+        """
+        self.matcher = matcher
+        self.reset()
+
+    def feed(self, chunk: str) -> bool:
+        """Read chunk; False if the input can no longer match"""
+        if not self.dead:
+            self.state = self.matcher.delta_star(self.state, chunk)
+            self.dead = self.matcher.is_dead(self.state)
+        return not self.dead
+
+    def finish(self) -> bool:
+        """Does the input fed so far match?"""
+        return not self.dead and self.matcher.is_final(self.state)
+
+    def reset(self) -> None:
+        """Start over with an empty input"""
+        self.state = self.matcher.start
+        self.dead = self.matcher.is_dead(self.state)
+
+
+async def accepts_stream(
+    matcher: CompiledDfa | LazyDfa[Any],
+    reader: "asyncio.StreamReader",
+    encoding: str = "utf-8",
+    chunk_size: int = CHUNK_SIZE,
+) -> bool:
+    """
+    Does everything up to the end of reader match? The bytes are
+    decoded incrementally (use "latin-1" with charclass.BYTES), and at
+    most chunk_size of them are held at a time. Reading stops early
+    once the input can no longer match, leaving the rest unread.
+    """
+    stream = StreamMatcher(matcher)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while chunk := await reader.read(chunk_size):
+        if not stream.feed(decoder.decode(chunk)):
+            return False
+    stream.feed(decoder.decode(b"", final=True))
+    return stream.finish()
@@ -0,0 +1,184 @@
+from typing import Callable, NamedTuple, Sequence
+
+from python_regex_engine.automata import ALPHABET, Nfa
+from python_regex_engine.charclass import CharSet, ClassAlphabet
+from python_regex_engine.monoids import Set, Sum
+
+
+def fresh_state_closure() -> Callable[[], Sum]:
+    state_index = Sum(0)
+
+    def increment() -> Sum:
+        nonlocal state_index
+        state_index += 1
+        return state_index
+
+    return increment
+
+
+fresh_state = fresh_state_closure()
+
+
+class Fragment(NamedTuple):
+    """A piece of a Thompson NFA with one way in and one way out"""
+
+    start: Sum
+    end: Sum
+
+
+class NfaBuilder:
+    def __init__(
+        self,
+        alphabet: str | CharSet = ALPHABET,
+        fresh: Callable[[], Sum] = fresh_state,
+    ):
+        """
+        Thompson's construction over a single shared arena.
+
+        Every operator adds its two fresh states and its ε-edges to
+        the same state list and transition dict, so building the NFA
+        for a regex of length n is O(n). The `Nfa` itself is only
+        created once, by `build`, from the final fragment.
+
+        The alphabet is either a string of characters or a CharSet
+        such as charclass.UNICODE. In the latter case, edges are
+        labelled with CharSets until the whole regex is known, and
+        `build` then splits the CharSet into the classes of a
+        ClassAlphabet and labels each edge with its classes.
+        """
+        self.alphabet = alphabet
+        self.fresh = fresh
+        self.states: list[Sum] = []
+        self.trans_fn: dict[tuple[Sum, str], set[Sum]] = {}
+        self.charset_edges: list[tuple[Sum, CharSet, Sum]] = []
+
+    def _state(self) -> Sum:
+        state = self.fresh()
+        self.states.append(state)
+        return state
+
+    def _edge(self, source: Sum, char: str, *targets: Sum) -> None:
+        try:
+            edges = self.trans_fn[(source, char)]
+        except KeyError:
+            edges = self.trans_fn[(source, char)] = set()
+        edges.update(targets)
+
+    def _frozen_edges(self) -> dict[tuple[Sum, str], Set[Sum]]:
+        """The edges as an Nfa takes them, once _final_alphabet added all"""
+        return {key: Set(targets) for key, targets in self.trans_fn.items()}
+
+    def symbol(self, char: str) -> Fragment:
+        # 1 -a-> 2
+        if isinstance(self.alphabet, CharSet):
+            return self.charset(CharSet.of(char))
+        start = self._state()
+        end = self._state()
+        self._edge(start, char, end)
+        return Fragment(start, end)
+
+    def charset(self, chars: CharSet) -> Fragment:
+        # 1 -[chars]-> 2
+        start = self._state()
+        end = self._state()
+        if isinstance(self.alphabet, CharSet):
+            self.charset_edges.append((start, chars, end))
+        else:
+            for char in self.alphabet:
+                if char in chars:
+                    self._edge(start, char, end)
+        return Fragment(start, end)
+
+    def empty(self) -> Fragment:
+        # 1 -ε-> 2
+        start = self._state()
+        end = self._state()
+        self._edge(start, "", end)
+        return Fragment(start, end)
+
+    def concat(self, left: Fragment, right: Fragment) -> Fragment:
+        start = self._state()
+        end = self._state()
+        self._edge(start, "", left.start)
+        self._edge(left.end, "", right.start)
+        self._edge(right.end, "", end)
+        return Fragment(start, end)
+
+    def union(self, left: Fragment, right: Fragment) -> Fragment:
+        start = self._state()
+        end = self._state()
+        self._edge(start, "", right.start, left.start)
+        self._edge(right.end, "", end)
+        self._edge(left.end, "", end)
+        return Fragment(start, end)
+
+    def star(self, inner: Fragment) -> Fragment:
+        start = self._state()
+        end = self._state()
+        self._edge(start, "", end, inner.start)
+        self._edge(inner.end, "", inner.start, end)
+        return Fragment(start, end)
+
+    def plus(self, inner: Fragment) -> Fragment:
+        # star without the ε-edge that skips inner
+        start = self._state()
+        end = self._state()
+        self._edge(start, "", inner.start)
+        self._edge(inner.end, "", inner.start, end)
+        return Fragment(start, end)
+
+    def _final_alphabet(self) -> str:
+        if not isinstance(self.alphabet, CharSet):
+            return self.alphabet
+        alphabet = ClassAlphabet.from_sets(
+            self.alphabet, [chars for _, chars, _ in self.charset_edges]
+        )
+        for source, chars, target in self.charset_edges:
+            for char in alphabet.members(chars):
+                self._edge(source, char, target)
+        self.charset_edges = []
+        return alphabet
+
+    def build(self, fragment: Fragment) -> Nfa[Sum]:
+        result: Nfa[Sum] = Nfa(
+            fragment.start,
+            Set(self.states),
+            self._final_alphabet(),
+            self._frozen_edges(),
+            Set({fragment.end}),
+        )
+        return result
+
+    def build_each(self, fragments: Sequence[Fragment]) -> list[Nfa[Sum]]:
+        """
+        An NFA for each of the fragments, all over the same alphabet,
+        so that they can be compared with each other
+        """
+        alphabet = self._final_alphabet()
+        edges = self._frozen_edges()
+        return [
+            Nfa(
+                fragment.start,
+                Set(self.states),
+                alphabet,
+                edges,
+                Set({fragment.end}),
+            )
+            for fragment in fragments
+        ]
+
+    def build_union(self, fragments: Sequence[Fragment]) -> Nfa[Sum]:
+        """
+        One NFA for all of the fragments: a new start state with ε-edges
+        to each of their starts, accepting at each of their ends.
+        """
+        start = self._state()
+        self._edge(start, "", *[fragment.start for fragment in fragments])
+        result: Nfa[Sum] = Nfa(
+            start,
+            Set(self.states),
+            self._final_alphabet(),
+            self._frozen_edges(),
+            Set([fragment.end for fragment in fragments]),
+        )
+        return result
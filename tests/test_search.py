@@ -0,0 +1,46 @@
+import unittest
+
+from python_regex_engine import compile, stats
+
+
+def _spans(pattern: str, text: str, alphabet: str) -> list[tuple[int, int]]:
+    return [match.span() for match in compile(pattern, alphabet).finditer(text)]
+
+
+def _transitions(pattern: str, text: str, alphabet: str) -> int:
+    """The characters read by the scanner's DFAs to find every match"""
+    scanner = compile(pattern, alphabet).scanner
+    with stats.collect() as collected:
+        for _ in scanner.finditer(text):
+            pass
+    return collected.counters["transitions"]
+
+
+class SearchTest(unittest.TestCase):
+    def test_leftmost_longest(self) -> None:
+        self.assertEqual(_spans("xyz|y", "xyzy", "xyz"), [(0, 3), (3, 4)])
+        self.assertEqual(_spans("ab|bcde", "abcde", "abcde"), [(0, 2)])
+        self.assertEqual(_spans("a|a*b", "aaab", "ab"), [(0, 4)])
+        self.assertEqual(_spans("a*", "baab", "ab"), [(0, 0), (1, 3), (3, 3), (4, 4)])
+
+    def test_search_and_match(self) -> None:
+        pattern = compile("b(0a)*", "ab0")
+        match = pattern.search("a0b0a0a")
+        assert match is not None
+        self.assertEqual(match.span(), (2, 7))
+        self.assertIsNone(pattern.search("a0a"))
+        match = pattern.match("b0a0", 0)
+        assert match is not None
+        self.assertEqual(match.span(), (0, 3))
+
+    def test_finditer_is_linear(self) -> None:
+        # Every "a" is a match, but a*b could match from each of them
+        # to the end of the text: rescanning that would be quadratic
+        small = _transitions("a|a*b", "a" * 4000, "ab")
+        large = _transitions("a|a*b", "a" * 16000, "ab")
+        # 4 times the text: about 4 times the work, not 16
+        self.assertLess(large, 5 * small)
+
+
+if __name__ == "__main__":
+    unittest.main()